@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+from collections import defaultdict
+
+from constants import DAY_FMT
+
+def month_of(day):
+    return day[:7] # "2024-05-08" -> "2024-05"
+
+class MonthAggregates:
+    """
+    Per month, per project totals for the month report. Built once from the
+    full history and then kept up to date by add(), so the report only has
+    to format numbers. Months are "YYYY-MM" strings, days are DAY_FMT strings.
+    """
+    def __init__(self, month_days=()):
+        self.totals = defaultdict(lambda: defaultdict(int)) # month -> project -> minutes
+        self.days = defaultdict(lambda: defaultdict(dict)) # month -> project -> day -> minutes
+        for day, times in dict(month_days).items():
+            day = day.strftime(DAY_FMT)
+            self.totals[month_of(day)] # months with nothing logged still get a heading
+            for project, minutes in times.items():
+                self.add(day, project, minutes)
+
+    def add(self, day, project, minutes):
+        month = month_of(day)
+        self.totals[month][project] += minutes
+        dates = self.days[month][project]
+        dates[day] = dates.get(day, 0) + minutes
+
+    def replace_day(self, day, old, new):
+        """swap a day's times for new ones, eg when another computer changed it"""
+        month = month_of(day)
+        for project, minutes in old.items():
+            self.totals[month][project] -= minutes
+            dates = self.days[month][project]
+            del dates[day]
+            if not dates:
+                del self.days[month][project]
+                del self.totals[month][project]
+        for project, minutes in new.items():
+            self.add(day, project, minutes)
+
+    def recent(self, months=None):
+        """the months, newest first; only the first so many if months is given"""
+        return sorted(self.totals, reverse=True)[:months]
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+"""
+Deduplicated, compressed backups of the timedata.
+
+Each distinct version of the data is stored once, lzma compressed, under
+BACKUP_FOLDER/objects named by its sha256. Every backup adds a tiny ref file
+under BACKUP_FOLDER/refs that names the time, the content hash and the machine.
+Nothing is ever rewritten in place, so several machines sharing the folder
+through Dropbox never conflict.
+
+Old refs are thinned out according to BACKUP_RETENTION, and with them the
+objects only they pointed to. An object written or reused in the last
+PRUNE_GRACE may belong to another machine's ref that has not synced yet,
+so the refs pointing to it stay until it is older.
+
+    python backups.py list
+    python backups.py restore 2024-05-08-09-30-00
+    python backups.py prune
+"""
+
+import time
+import lzma
+import hashlib
+import platform
+from collections import namedtuple
+
+from constants import TIMECLOCK_FILE, BACKUP_FOLDER, BACKUP_RETENTION
+
+STAMP_FMT = '%Y-%m-%d-%H-%M-%S'
+STAMP_LEN = 19
+DIGEST_LEN = 64
+PRUNE_GRACE = 86400 # seconds
+
+Backup = namedtuple("Backup", "stamp digest origin")
+
+def objects_folder(folder=BACKUP_FOLDER):
+    return folder / "objects"
+
+def refs_folder(folder=BACKUP_FOLDER):
+    return folder / "refs"
+
+def object_file(digest, folder=BACKUP_FOLDER):
+    return objects_folder(folder) / f"{digest}.xz"
+
+def ref_name(bkup):
+    return f"{bkup.stamp}_{bkup.digest}_{bkup.origin}"
+
+def parse_ref(name):
+    stamp = name[:STAMP_LEN]
+    digest = name[STAMP_LEN+1:STAMP_LEN+1+DIGEST_LEN]
+    origin = name[STAMP_LEN+DIGEST_LEN+2:]
+    return Backup(stamp, digest, origin)
+
+def list_backups(folder=BACKUP_FOLDER):
+    """all backups, oldest first"""
+    if not refs_folder(folder).exists():
+        return []
+    return sorted(parse_ref(f.name) for f in refs_folder(folder).iterdir())
+
+def backup(content, folder=BACKUP_FOLDER, stamp=None):
+    """
+    store content (str or bytes) as a new backup
+    returns the new Backup, or None if the content is the same as the latest backup
+    """
+    if isinstance(content, str):
+        content = content.encode()
+    digest = hashlib.sha256(content).hexdigest()
+    existing = list_backups(folder)
+    if existing and existing[-1].digest == digest:
+        return None
+
+    objects_folder(folder).mkdir(parents=True, exist_ok=True)
+    refs_folder(folder).mkdir(parents=True, exist_ok=True)
+    obj = object_file(digest, folder)
+    if obj.exists():
+        obj.touch() # in use again; see prune()
+    else:
+        tmp = obj.with_suffix(".tmp")
+        tmp.write_bytes(lzma.compress(content))
+        tmp.replace(obj)
+    bkup = Backup(stamp or time.strftime(STAMP_FMT), digest, f"{platform.node()}_{platform.system()}")
+    (refs_folder(folder) / ref_name(bkup)).touch()
+    prune(folder)
+    return bkup
+
+def find_backup(which, folder=BACKUP_FOLDER):
+    """find a backup by stamp or digest prefix; the newest one matching wins"""
+    for bkup in reversed(list_backups(folder)):
+        if bkup.stamp.startswith(which) or bkup.digest.startswith(which):
+            return bkup
+    raise KeyError(f"no backup matching {which!r}")
+
+def read_backup(bkup, folder=BACKUP_FOLDER):
+    if isinstance(bkup, str):
+        bkup = find_backup(bkup, folder)
+    return lzma.decompress(object_file(bkup.digest, folder).read_bytes())
+
+def restore(bkup, fn=TIMECLOCK_FILE, folder=BACKUP_FOLDER):
+    """roll the data file back to the given backup. The current file is backed up first."""
+    content = read_backup(bkup, folder)
+    if fn.exists():
+        backup(fn.read_bytes(), folder)
+    tmp = fn.with_suffix(".tmp")
+    tmp.write_bytes(content)
+    tmp.replace(fn)
+
+def keep_set(backups, now=None, retention=BACKUP_RETENTION):
+    """the backups that survive the retention policy"""
+    now = now or time.time()
+    keep = set(backups[-1:]) # always keep the latest
+    buckets = {}
+    for bkup in backups: # oldest first, so the newest in each bucket wins
+        t = time.mktime(time.strptime(bkup.stamp, STAMP_FMT))
+        age = (now - t) / 86400
+        for max_age, bucket_fmt in retention:
+            if max_age is None or age <= max_age:
+                buckets[max_age, time.strftime(bucket_fmt, time.localtime(t))] = bkup
+                break
+    keep.update(buckets.values())
+    return keep
+
+def modified_since(path, t):
+    try:
+        return path.stat().st_mtime > t
+    except FileNotFoundError:
+        return False
+
+def prune(folder=BACKUP_FOLDER, now=None):
+    """
+    delete the refs outside the retention policy and the objects that only
+    they pointed to; returns the number of refs deleted. Objects this
+    machine doesn't know a ref for are left alone.
+    """
+    now = now or time.time()
+    backups = list_backups(folder)
+    keep = keep_set(backups, now)
+    used = {bkup.digest for bkup in keep}
+    dropped = set()
+    removed = 0
+    for bkup in backups:
+        if bkup in keep:
+            continue
+        if bkup.digest not in used and modified_since(object_file(bkup.digest, folder), now - PRUNE_GRACE):
+            continue # the object would go; not yet
+        (refs_folder(folder) / ref_name(bkup)).unlink(missing_ok=True)
+        dropped.add(bkup.digest)
+        removed += 1
+    # list again: refs may have synced in from another machine meanwhile
+    for digest in dropped - {bkup.digest for bkup in list_backups(folder)}:
+        object_file(digest, folder).unlink(missing_ok=True)
+    return removed
+
+def import_legacy(folder=BACKUP_FOLDER):
+    """move the old full-copy backups (one file per launch) into the store"""
+    count = 0
+    for old in sorted(folder.glob(f"*_{TIMECLOCK_FILE.name}")):
+        stamp = old.name[:STAMP_LEN]
+        try:
+            time.strptime(stamp, STAMP_FMT)
+        except ValueError:
+            continue
+        backup(old.read_bytes(), folder, stamp=stamp)
+        old.unlink()
+        count += 1
+    prune(folder)
+    return count
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="timekeeper backups")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="list all backups")
+    rst = sub.add_parser("restore", help="restore a backup over the data file")
+    rst.add_argument("which", help="timestamp or hash prefix")
+    sub.add_parser("prune", help="apply the retention policy")
+    sub.add_parser("import-legacy", help="fold old full-copy backups into the store")
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        for bkup in list_backups():
+            try:
+                size = object_file(bkup.digest).stat().st_size
+            except FileNotFoundError:
+                size = "missing" # not synced yet, or lost
+            print(f"{bkup.stamp}  {bkup.digest[:12]}  {size:>8}  {bkup.origin}")
+    elif args.cmd == "restore":
+        bkup = find_backup(args.which)
+        restore(bkup)
+        print("restored", bkup.stamp)
+    elif args.cmd == "prune":
+        print("removed", prune(), "backups")
+    elif args.cmd == "import-legacy":
+        print("imported", import_legacy(), "old backups")
+
+if __name__ == "__main__":
+    main()
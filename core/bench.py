@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks for loading, saving, ticking and the reports, at several sizes
+of made up history. Runs without a display and never imports the GUI.
+Everything happens in a temp folder; the real timedata and backups are
+not touched.
+
+    python bench.py --years 1 5 10 -o bench.json
+    python bench.py --baseline bench.json     # flags anything that got slower
+
+Results are the best time of --repeat runs, in seconds.
+"""
+
+import io
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import statistics
+from pathlib import Path
+from datetime import date, timedelta
+from contextlib import redirect_stdout
+
+import logs
+import storage
+from constants import DAY_FMT, RESET
+from scheduler import Scheduler
+from timeclock import Timeclock
+
+BENCH_STORES = dict(
+    json=lambda tmp: storage.JsonStore(tmp/"timedata.json"),
+    journal=lambda tmp: storage.JournalStore(tmp/"timedata.json", tmp/"timedata.journal"),
+    sharded=lambda tmp: storage.ShardedStore(tmp/"timedata", tmp/"timedata.json"),
+    binary=lambda tmp: storage.BinaryStore(tmp/"timedata.tkc", tmp/"timedata.json"),
+    sqlite=lambda tmp: storage.SqliteStore(tmp/"timedata.sqlite", tmp/"timedata.json"),
+    nodes=lambda tmp: storage.NodeStore(tmp/"timenodes", "bench", tmp/"timedata.json"),
+    )
+TOLERANCE = 0.25 # slower than the baseline by more than this is a regression
+NOISE = 0.001 # seconds; differences smaller than this are never flagged
+TICKS = 100 # tick() calls per timed run
+
+class IdleScheduler(Scheduler):
+    """takes jobs but never runs them, so no autosave lands in the middle of a timing"""
+    def run(self):
+        pass
+
+def synthetic_timedata(years=5, tasks=8, reset_every=30, seed=0, end=None):
+    """
+    made up but realistic timedata: most weekdays have 6 to 9 hours spread
+    over 1 to 3 tasks, a few weekends have some, some tasks are much busier
+    than others, and each task is billed about every reset_every days
+    """
+    rng = random.Random(seed)
+    names = [f"TASK {n}" for n in range(1, tasks+1)]
+    weights = [1/n for n in range(1, tasks+1)]
+    end = end or date.today()
+    day = end - timedelta(days=int(365.25*years))
+    next_bill = {name: rng.randint(1, reset_every) for name in names}
+    data = {}
+    while day < end:
+        workday = day.weekday() < 5
+        if rng.random() < (0.95 if workday else 0.08):
+            total = max(15, int(rng.gauss(450 if workday else 120, 60)))
+            picked = set(rng.choices(names, weights, k=rng.randint(1, 3)))
+            cuts = sorted(rng.sample(range(1, total), len(picked)-1)) if len(picked) > 1 else []
+            times = data[day.strftime(DAY_FMT)] = {}
+            for name, start, stop in zip(sorted(picked), [0]+cuts, cuts+[total]):
+                times[name] = stop - start
+        for name in names:
+            next_bill[name] -= 1
+            if next_bill[name] <= 0 and workday:
+                data.setdefault(day.strftime(DAY_FMT), {})[RESET.format(name)] = True
+                next_bill[name] = reset_every + rng.randint(-3, 3)
+        day += timedelta(days=1)
+    return data
+
+def best(func, repeat, setup=None):
+    """the best and median time of repeat runs of func(setup())"""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg) if setup else func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+def bench_size(kind, years, tasks, reset_every, repeat, scheduler):
+    """{operation: (best, median)} for one store and size"""
+    data = synthetic_timedata(years, tasks, reset_every)
+    busiest = max((name for times in data.values() for name in times if not name.endswith(RESET.format(""))),
+        key=lambda name: sum(times.get(name, 0) for times in data.values()))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        make_store = lambda: BENCH_STORES[kind](tmp)
+        make_store().import_all(data)
+        def fresh():
+            timeclock = Timeclock(store=make_store(), scheduler=scheduler)
+            timeclock.load_history()
+            return timeclock
+
+        if kind == "json":
+            results["load_timeclock"] = best(lambda: storage.load_timeclock(tmp/"timedata.json"), repeat)
+            results["save_timeclock"] = best(lambda: storage.save_timeclock(data, tmp/"legacy.json"), repeat)
+        results["load"] = best(fresh, repeat)
+
+        timeclock = fresh()
+        today = time.strftime(DAY_FMT)
+        def save():
+            timeclock.add_minutes(today, "BENCH", 1) # so there is something to write
+            timeclock.flush()
+        results["save"] = best(save, repeat)
+
+        timeclock.clock_in("BENCH")
+        def ticks():
+            for _ in range(TICKS):
+                timeclock.tick()
+        tick_best, tick_median = best(ticks, repeat)
+        results["tick"] = tick_best/TICKS, tick_median/TICKS
+        timeclock.clock_out()
+
+        results["monthreport_cold"] = best(lambda tc: tc.monthreport(), repeat, setup=fresh)
+        results["monthreport"] = best(timeclock.monthreport, repeat)
+        results["taskreport_cold"] = best(lambda tc: tc.taskreport(busiest), repeat, setup=fresh)
+        results["taskreport"] = best(lambda: timeclock.taskreport(busiest), repeat)
+    return results
+
+def run(kinds, years_list, tasks, reset_every, repeat):
+    storage.BACKUPS = False # never back up from a benchmark
+    logs.root_logger().setLevel("WARNING")
+    scheduler = IdleScheduler("bench")
+    results = {}
+    for kind in kinds:
+        for years in years_list:
+            print(f"{kind} store, {years} years ...", file=sys.stderr)
+            with redirect_stdout(io.StringIO()): # in case anything still prints
+                timings = bench_size(kind, years, tasks, reset_every, repeat, scheduler)
+            for op, (fastest, median) in timings.items():
+                results[f"{kind}/{years}y/{op}"] = dict(best=fastest, median=median)
+    if "wx" in sys.modules:
+        raise RuntimeError("the benchmark imported wx")
+    return dict(
+        meta=dict(python=platform.python_version(), platform=platform.platform(),
+            date=time.strftime("%Y-%m-%d %H:%M"), tasks=tasks, reset_every=reset_every, repeat=repeat),
+        results=results)
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """print a table against the baseline; returns the keys that got slower"""
+    slower = []
+    print(f"{'':<40}{'best':>13}{'baseline':>13}")
+    for key, timing in results["results"].items():
+        new = timing["best"]
+        old = baseline["results"].get(key, {}).get("best")
+        if old is None:
+            print(f"{key:<40}{new*1000:>10.3f} ms")
+            continue
+        change = (new - old) / old if old else 0
+        flag = ""
+        if change > tolerance and new - old > NOISE:
+            flag = "  SLOWER"
+            slower.append(key)
+        print(f"{key:<40}{new*1000:>10.3f} ms{old*1000:>10.3f} ms{change:>+8.0%}{flag}")
+    return slower
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="timekeeper benchmarks")
+    parser.add_argument("--store", nargs="+", default=["json"], choices=list(BENCH_STORES))
+    parser.add_argument("--years", nargs="+", type=int, default=[1, 5, 10])
+    parser.add_argument("--tasks", type=int, default=8)
+    parser.add_argument("--reset-every", type=int, default=30, help="days between billpoints per task")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write the results to this json file")
+    parser.add_argument("--baseline", help="results json from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown, eg 0.25 for 25%%")
+    args = parser.parse_args()
+
+    results = run(args.store, args.years, args.tasks, args.reset_every, args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {"results": {}}
+    if compare(results, baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
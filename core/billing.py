@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+Billing statements: the task report for every task at once, with a choice
+of rounding rule.
+
+A RoundingRule rounds to units of 6, 10 or 15 minutes, either by carrying
+the leftover minutes into the next day ("carry") or by rounding half up
+and dropping them ("half_up"), and either every day or only each billing
+section's total ("day" or "section"). The default rule, 15 minute units
+with carry every day, is the task report's and gives the same text.
+
+BillingEngine sorts the whole timedata into tasks and billing sections in
+one pass, so a statement for every task costs one scan instead of one per task.
+
+    python billing.py                         # every task, default rule
+    python billing.py --unit 6 --mode half_up --task "TASK 1"
+"""
+
+from bisect import bisect
+from collections import defaultdict
+
+from constants import DAY_FMT
+from model import TASKS, as_timedata
+
+UNITS = (6, 10, 15)
+MODES = ("carry", "half_up")
+PER = ("day", "section")
+
+class RoundingRule:
+    def __init__(self, unit=15, mode="carry", per="day"):
+        if unit not in UNITS or mode not in MODES or per not in PER:
+            raise ValueError(f"no rounding rule for unit={unit!r} mode={mode!r} per={per!r}; "
+                f"use unit {UNITS}, mode {MODES}, per {PER}")
+        self.unit = unit
+        self.mode = mode
+        self.per = per
+
+    def __repr__(self):
+        return f"RoundingRule(unit={self.unit}, mode={self.mode!r}, per={self.per!r})"
+
+    def round(self, minutes, carry=0):
+        """(billed minutes, carry out) for minutes plus the carry in"""
+        total = minutes + carry
+        if self.mode == "carry":
+            return total - total % self.unit, total % self.unit
+        return (2*total + self.unit) // (2*self.unit) * self.unit, 0
+
+    def fraction(self, minutes):
+        """minutes as hours and hundredths, 02.25"""
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:0>2}.{round(minutes * 100 / 60):0>2}"
+
+DEFAULT_RULE = RoundingRule()
+QUARTER_HOURS = RoundingRule(15, "half_up")
+
+def min_to_human(minutes):
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h, {minutes}m"
+
+def min_to_fraction(minutes):
+    """to the nearest quarter hour, 2.25"""
+    hours, minutes = divmod(QUARTER_HOURS.round(minutes)[0], 60)
+    return f"{hours}.{minutes * 100 // 60}"
+
+def section_lines(label, section, days, carry, rule=DEFAULT_RULE):
+    """one billing section of the task report; returns the text and the carry out of it"""
+    sec_out = [f"=== Billed {label} ==="]
+    sec_sum = 0
+    for linenum, day in enumerate(section,1):
+        if rule.per == "day":
+            billed, carry = rule.round(days[day], carry)
+        else:
+            billed = days[day] # rounded once, at the end
+        sec_sum += billed
+        sec_out.append(
+            f"{linenum:<3}\t"
+            f"{day.strftime(DAY_FMT)}\t{days[day]:<4}\t"
+            f"{rule.fraction(billed)}\t"
+            f"{min_to_human(sec_sum):<8}\t{carry}")
+    if rule.per == "section":
+        billed, carry = rule.round(sec_sum, carry)
+        sec_out.append(f"rounded\t\t\t{rule.fraction(billed)}\t{min_to_human(billed):<8}\t{carry}")
+    return "\n".join(sec_out) + "\n\n", carry
+
+def split_sections(days, resets):
+    """
+    [(label, days)] in the order the report shows them: the days since the
+    last billpoint first as "TBD", then each billed section, newest first
+    """
+    resets = sorted(resets)
+    daylist = sorted(days)
+    splitpoints = [bisect(daylist, billdate) for billdate in resets]
+    sections = [("TBD", daylist[splitpoints[-1] if splitpoints else 0:])]
+    for billdate, start, end in reversed(list(zip(resets, [0]+splitpoints, splitpoints))):
+        sections.append((billdate, daylist[start:end]))
+    return [(label, section) for label, section in sections if section]
+
+class BillingEngine:
+    def __init__(self, timedata, rule=DEFAULT_RULE):
+        from datetime import date
+        self.rule = rule
+        self.days = defaultdict(dict) # task -> date -> minutes
+        self.resets = defaultdict(list) # task -> [dates]
+        names = TASKS.names
+        dates = {}
+        for ordinal, task_id, minutes in as_timedata(timedata).entries():
+            if (day := dates.get(ordinal)) is None:
+                day = dates[ordinal] = date.fromordinal(ordinal)
+            if minutes is None:
+                self.resets[names[task_id]].append(day)
+            elif minutes:
+                self.days[names[task_id]][day] = minutes
+
+    def tasks(self):
+        return sorted(self.days)
+
+    def statement(self, task):
+        """the task report for task, rounded by the rule"""
+        days = self.days.get(task, {})
+        output = f"Times for {task}:\n(line) (Date) (day actual min) (day time rounded) (section sum) (carry min)\n\n"
+        carry = 0
+        for label, section in split_sections(days, self.resets.get(task, ())):
+            sec_out, carry = section_lines(label, section, days, carry, self.rule)
+            output += sec_out
+        return output
+
+    def statements(self, tasks=None):
+        """{task: statement} for the given tasks, or every task with time logged"""
+        return {task: self.statement(task) for task in (self.tasks() if tasks is None else tasks)}
+
+def billing_engine(timeclock, rule=DEFAULT_RULE):
+    """a BillingEngine over the timeclock's complete history"""
+    timeclock.load_history()
+    with timeclock.lock:
+        return BillingEngine(timeclock.timedata, rule)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="billing statements for every task")
+    parser.add_argument("--unit", type=int, choices=UNITS, default=15, help="minutes")
+    parser.add_argument("--mode", choices=MODES, default="carry", help="carry the leftover minutes, or round half up")
+    parser.add_argument("--per", choices=PER, default="day", help="round every day or only section totals")
+    parser.add_argument("--task", action="append", help="only this task; can be given more than once")
+    args = parser.parse_args()
+
+    from timeclock import Timeclock
+    engine = billing_engine(Timeclock(), RoundingRule(args.unit, args.mode, args.per))
+    print("\n".join(engine.statements(args.task).values()))
+
+if __name__ == "__main__":
+    main()
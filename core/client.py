@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Client for the timekeeper daemon (see daemon.py). Does not import wx or
+load any timedata, so it's fast enough for git hooks and editor plugins.
+
+    python client.py status
+    python client.py in "TASK 1"
+    python client.py out
+    python client.py report --months 2
+    python client.py task "TASK 1"
+    python client.py bill "TASK 1"
+    python client.py query --group-by week --since 2024-04-01 --until 2024-06-30
+
+The protocol is one json object per line each way: {"cmd": ..., args...}
+is answered with {"ok": true, "result": ...} or {"ok": false, "error": ...}.
+"""
+
+import sys
+import json
+import socket
+from threading import Thread
+
+from constants import SOCKET_FILE
+
+class DaemonError(Exception):
+    pass
+
+def daemon_running(path=SOCKET_FILE):
+    if not hasattr(socket, "AF_UNIX") or not path.exists():
+        return False
+    try:
+        DaemonClient(path).call("status")
+        return True
+    except (OSError, DaemonError):
+        return False
+
+class DaemonClient:
+    def __init__(self, path=SOCKET_FILE, timeout=10):
+        self.path = path
+        self.timeout = timeout
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(str(self.path))
+        return sock
+
+    def call(self, cmd, **kwargs):
+        with self.connect() as sock, sock.makefile('rw', encoding='utf-8') as f:
+            f.write(json.dumps(dict(cmd=cmd, **kwargs)) + "\n")
+            f.flush()
+            response = json.loads(f.readline() or '{"ok": false, "error": "no response"}')
+        if not response["ok"]:
+            raise DaemonError(response["error"])
+        return response["result"]
+
+class RemoteTimeclock(DaemonClient):
+    """stands in for a Timeclock when the GUI attaches to a running daemon"""
+    def __init__(self, callback=None, path=SOCKET_FILE):
+        super().__init__(path)
+        self.callback = callback
+        if callback:
+            Thread(target=self.watch, daemon=True).start()
+
+    def watch(self):
+        """the daemon pushes a line every time the status text changes"""
+        sock = self.connect()
+        sock.settimeout(None)
+        with sock, sock.makefile('rw', encoding='utf-8') as f:
+            f.write(json.dumps(dict(cmd="watch")) + "\n")
+            f.flush()
+            for line in f:
+                self.callback(json.loads(line)["status"])
+
+    @property
+    def clocked_in(self):
+        """the task the daemon is clocked in to, or OFF"""
+        return self.call("clocked_in")
+
+    def clock_in(self, job_name):
+        self.call("clock_in", task=job_name)
+
+    def clock_out(self):
+        self.call("clock_out")
+
+    def clock_billpoint(self, job_name, event=None):
+        self.call("billpoint", task=job_name)
+
+    def report(self):
+        return self.call("status")
+
+    def tick(self):
+        pass # the daemon keeps time and pushes the status
+
+    def monthreport(self, months=None):
+        return self.call("report", months=months)
+
+    def monthreport_rows(self, months=None, month=None, task=None):
+        return self.call("report", months=months, month=month, task=task).split("\n")
+
+    def report_months(self):
+        return self.call("months")
+
+    def report_tasks(self):
+        return self.call("tasks")
+
+    def taskreport(self, task):
+        return self.call("taskreport", task=task)
+
+    def taskreport_rows(self, task):
+        return self.taskreport(task).split("\n")
+
+    def query(self, start=None, end=None, tasks=None, group_by="task"):
+        from query import QueryRow
+        return tuple(QueryRow(*row) for row in self.call("query", start=start, end=end, tasks=tasks, group_by=group_by))
+
+    def save(self):
+        self.call("save")
+
+    def flush(self):
+        self.call("flush")
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="control the timekeeper daemon")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="what's clocked in")
+    cin = sub.add_parser("in", help="clock in")
+    cin.add_argument("task")
+    sub.add_parser("out", help="clock out")
+    rpt = sub.add_parser("report", help="times by month")
+    rpt.add_argument("--months", type=int, help="only the this many most recent months")
+    tsk = sub.add_parser("task", help="billing report for one task")
+    tsk.add_argument("task")
+    bill = sub.add_parser("bill", help="mark a task as billed today")
+    bill.add_argument("task")
+    qry = sub.add_parser("query", help="hours per task and period")
+    qry.add_argument("--group-by", default="task", choices=("day", "week", "month", "quarter", "task"))
+    qry.add_argument("--since", help="first day, YYYY-MM-DD")
+    qry.add_argument("--until", help="last day, YYYY-MM-DD")
+    qry.add_argument("--task", action="append", help="only this task; can be given more than once")
+    sub.add_parser("daemon", help="run the daemon in the foreground")
+    args = parser.parse_args()
+
+    if args.cmd == "daemon":
+        import daemon
+        daemon.main()
+        return
+    client = DaemonClient()
+    commands = {
+        "status": lambda: client.call("status"),
+        "in": lambda: client.call("clock_in", task=args.task),
+        "out": lambda: client.call("clock_out"),
+        "report": lambda: client.call("report", months=args.months),
+        "task": lambda: client.call("taskreport", task=args.task),
+        "bill": lambda: client.call("billpoint", task=args.task),
+        "query": lambda: "\n".join(f"{period or ''}\t{task}\t{minutes/60:.2f}" for period, task, minutes in
+            client.call("query", start=args.since, end=args.until, tasks=args.task, group_by=args.group_by)),
+        }
+    try:
+        print(commands[args.cmd]())
+    except (OSError, DaemonError) as e:
+        sys.exit(f"timekeeper daemon: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""
+Compact binary, column oriented format for the timedata.
+
+The timedata is really a table of (day, project, minutes) rows plus the
+billing reset flags, so that's how it's stored: a small string table of
+project names followed by one array per column.
+
+    header   b"TKC1", number of strings, number of rows    (little endian uint32)
+    strings  uint16 length + utf-8 bytes, for each project name, padded to 4 bytes
+    days     uint32 * rows    date ordinals, sorted
+    projects uint32 * rows    index into the string table
+    minutes  int32 * rows
+    flags    uint8 * rows     HAS_MINUTES | IS_RESET, or EMPTY_DAY for a day without entries
+
+ColumnarFile mmaps a file and scans the columns directly, without building
+the timedata dict; BinaryStore answers the report queries that way. Conversion to and from the json layout is lossless:
+
+    python columnar.py tobin timedata.json timedata.tkc
+    python columnar.py tojson timedata.tkc timedata.json
+"""
+
+import sys
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from datetime import date
+from collections import namedtuple
+
+from constants import RESET
+
+MAGIC = b"TKC1"
+HEADER = struct.Struct("<4sII")
+HAS_MINUTES = 1
+IS_RESET = 2
+EMPTY_DAY = 4
+RESET_SUFFIX = RESET.format("")
+
+Columns = namedtuple("Columns", "strings days projects minutes flags")
+
+def split_key(key, value):
+    """timedata key -> (project, is_reset)"""
+    if value is True and key.endswith(RESET_SUFFIX):
+        return key[:-len(RESET_SUFFIX)], True
+    return key, False
+
+def to_columns(timedata):
+    strings = []
+    ids = {}
+    days, projects, minutes, flags = array('I'), array('I'), array('i'), array('B')
+    for day in sorted(timedata):
+        ordinal = date.fromisoformat(day).toordinal() # DAY_FMT is iso
+        times = timedata[day]
+        if not times:
+            days.append(ordinal); projects.append(0); minutes.append(0); flags.append(EMPTY_DAY)
+            continue
+        rows = {} # project -> row index, to put a project's minutes and reset in one row
+        for key, value in times.items():
+            project, is_reset = split_key(key, value)
+            if project not in ids:
+                ids[project] = len(strings)
+                strings.append(project)
+            if project not in rows:
+                rows[project] = len(days)
+                days.append(ordinal); projects.append(ids[project]); minutes.append(0); flags.append(0)
+            row = rows[project]
+            if is_reset:
+                flags[row] |= IS_RESET
+            else:
+                minutes[row] = value
+                flags[row] |= HAS_MINUTES
+    return Columns(strings, days, projects, minutes, flags)
+
+def day_times(cols):
+    """(date ordinal, {project: minutes, "project_RESET": True}) for every day, in order"""
+    times = None
+    last = None
+    for ordinal, project, mins, flag in zip(cols.days, cols.projects, cols.minutes, cols.flags):
+        if ordinal != last:
+            if times is not None:
+                yield last, times
+            times = {}
+            last = ordinal
+        if flag & HAS_MINUTES:
+            times[cols.strings[project]] = mins
+        if flag & IS_RESET:
+            times[RESET.format(cols.strings[project])] = True
+    if times is not None:
+        yield last, times
+
+def from_columns(cols):
+    return {date.fromordinal(ordinal).isoformat(): times for ordinal, times in day_times(cols)}
+
+def native(arr):
+    """arrays are stored little endian"""
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+def pad(n):
+    return -n % 4
+
+def dumps(cols):
+    out = [HEADER.pack(MAGIC, len(cols.strings), len(cols.days))]
+    size = HEADER.size
+    for s in cols.strings:
+        b = s.encode()
+        out.append(struct.pack("<H", len(b)) + b)
+        size += 2 + len(b)
+    out.append(b"\0" * pad(size))
+    for arr in (cols.days, cols.projects, cols.minutes, cols.flags):
+        out.append(native(arr).tobytes())
+    return b"".join(out)
+
+class ColumnarFile:
+    """read only, memory mapped view of a columnar file"""
+    def __init__(self, fn):
+        self.f = open(fn, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, nstrings, nrows = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError(f"{fn} is not a timekeeper columnar file")
+        pos = HEADER.size
+        self.strings = []
+        for _ in range(nstrings):
+            length, = struct.unpack_from("<H", self.mm, pos)
+            self.strings.append(self.mm[pos+2:pos+2+length].decode())
+            pos += 2 + length
+        pos += pad(pos)
+        view = memoryview(self.mm)
+        self.days = self.column(view, pos, nrows, 'I')
+        self.projects = self.column(view, pos + 4*nrows, nrows, 'I')
+        self.minutes = self.column(view, pos + 8*nrows, nrows, 'i')
+        self.flags = self.column(view, pos + 12*nrows, nrows, 'B')
+
+    def column(self, view, pos, nrows, typecode):
+        size = array(typecode).itemsize
+        col = view[pos:pos + size*nrows].cast(typecode)
+        if sys.byteorder == "big" and size > 1:
+            col = native(array(typecode, col))
+        return col
+
+    def columns(self):
+        return Columns(self.strings, self.days, self.projects, self.minutes, self.flags)
+
+    def close(self):
+        for col in (self.days, self.projects, self.minutes, self.flags):
+            if isinstance(col, memoryview):
+                col.release()
+        self.mm.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def task_minutes(self, task, after=0):
+        """{date ordinal: minutes} and sorted reset ordinals for one task, for the days after the ordinal after"""
+        try:
+            pid = self.strings.index(task)
+        except ValueError:
+            return {}, []
+        days = {}
+        resets = []
+        start = bisect_right(self.days, after) # rows are sorted by day
+        for row in range(start, len(self.days)):
+            if self.projects[row] == pid and not (flag := self.flags[row]) & EMPTY_DAY:
+                if (mins := self.minutes[row]):
+                    days[self.days[row]] = mins
+                if flag & IS_RESET:
+                    resets.append(self.days[row])
+        return days, resets
+
+def load_columnar(fn):
+    with ColumnarFile(fn) as cf:
+        return from_columns(cf.columns())
+
+def json_to_binary(src, dst):
+    with open(src) as f:
+        timedata = json.load(f)
+    with open(dst, 'wb') as f:
+        f.write(dumps(to_columns(timedata)))
+
+def binary_to_json(src, dst):
+    timedata = load_columnar(src)
+    with open(dst, 'w') as f:
+        json.dump(timedata, f, indent=2)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="convert timedata between json and the columnar format")
+    parser.add_argument("direction", choices=["tobin", "tojson"])
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    args = parser.parse_args()
+    if args.direction == "tobin":
+        json_to_binary(args.src, args.dst)
+    else:
+        binary_to_json(args.src, args.dst)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 from pathlib import Path
+import tempfile
+import getpass
 
 p = Path(__file__).parent # for resource files
 
@@ -8,8 +10,19 @@ p = Path(__file__).parent # for resource files
 TIMECLOCK_FILE = p.parent / "timedata.json"
 BACKUP_FOLDER = p.parent / "timedatabackups"
 BACKUPS = True # make backups of the datafiles?
+BACKUP_RETENTION = ( # (max age in days, keep the newest backup per ...)
+    (1, "%Y-%m-%d %H"), # hourly for a day
+    (31, "%Y-%m-%d"), # daily for a month
+    (None, "%Y-%m"), # monthly after that
+    )
 SETTING_FILE = p.parent / "timekeeper_settings.json"
 SENTINEL_FILE = p.parent / "donttouch.txt"
+JOURNAL_FILE = p.parent / "timedata.journal"
+DATA_FOLDER = p.parent / "timedata" # for the sharded storage
+BINARY_FILE = p.parent / "timedata.tkc" # for the binary storage
+SQLITE_FILE = p.parent / "timedata.sqlite" # for the sqlite storage
+NODES_FOLDER = p.parent / "timenodes" # for the nodes storage; one journal per computer
+SOCKET_FILE = Path(tempfile.gettempdir()) / f"timekeeper-{getpass.getuser()}.sock" # daemon control socket; local, not in dropbox
 
 assets = p / "assets"
 LOGO_FILE = assets / "clock.png"
@@ -24,5 +37,12 @@ DAY_FMT = "%Y-%m-%d"
 OFF = "OFF" # special clocked in value that does not log
 REPORT_FRACTION = True # use a fraction of hours in the report window (2.25 instead of 2h 15m)
 AUTOSAVE = 15 # autosave every 15 minutes
+WATCH_INTERVAL = 10 # seconds between checks for changes another computer made to the data file (eg through Dropbox); 0 for never
 RESET = "{}_RESET" # flag used to set internal billing reset. Bill INCLUDES this day
-
+STORAGE = "json" # how timedata is kept on disk; see storage.py
+JOURNAL_COMPACT = 500 # fold the journal into the timedata file after this many entries
+METRICS = False # time load, save, tick, reports etc; costs nothing when off. See metrics.py
+METRICS_FILE = p.parent / "timekeeper_metrics.prom" # prometheus text format, rewritten every METRICS_INTERVAL seconds
+METRICS_INTERVAL = 60
+LOG_LEVEL = "INFO" # DEBUG, INFO, WARNING, ERROR
+LOG_BUFFER = 100 # log lines held back before writing; warnings and errors go out at once
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+Headless timekeeper. Owns the Timeclock and takes commands on SOCKET_FILE,
+a unix domain socket; see client.py for the protocol and a command line
+client. The GUI attaches to a running daemon instead of loading the data
+itself.
+
+    python daemon.py
+"""
+
+import sys
+import json
+import signal
+import socket
+import socketserver
+from threading import Lock
+
+from constants import SOCKET_FILE
+from timeclock import Timeclock
+
+def clock_in(timeclock, task):
+    timeclock.clock_in(task)
+    timeclock.save()
+    return timeclock.report()
+
+def clock_out(timeclock):
+    timeclock.clock_out()
+    timeclock.save()
+    return timeclock.report()
+
+def billpoint(timeclock, task):
+    timeclock.clock_billpoint(task)
+    timeclock.save()
+    return f"{task} billed"
+
+COMMANDS = dict(
+    status=lambda timeclock: timeclock.report(),
+    clocked_in=lambda timeclock: timeclock.clocked_in,
+    clock_in=clock_in,
+    clock_out=clock_out,
+    report=lambda timeclock, months=None, month=None, task=None: '\n'.join(timeclock.monthreport_rows(months, month, task)),
+    taskreport=lambda timeclock, task: timeclock.taskreport(task),
+    months=lambda timeclock: timeclock.report_months(),
+    tasks=lambda timeclock: timeclock.report_tasks(),
+    query=lambda timeclock, start=None, end=None, tasks=None, group_by="task": timeclock.query(start, end, tasks, group_by),
+    billpoint=billpoint,
+    save=lambda timeclock: timeclock.save(),
+    flush=lambda timeclock: timeclock.flush(),
+    )
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                cmd = request.pop("cmd")
+                if cmd == "watch":
+                    self.server.watch(self)
+                    return
+                if cmd not in COMMANDS:
+                    raise ValueError(f"unknown command {cmd!r}")
+                result = COMMANDS[cmd](self.server.timeclock, **request)
+                response = dict(ok=True, result=result)
+            except Exception as e:
+                response = dict(ok=False, error=f"{type(e).__name__}: {e}")
+            self.send(response)
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path=SOCKET_FILE):
+        self.watchers = []
+        self.watch_lock = Lock()
+        self.timeclock = Timeclock(callback=self.broadcast)
+        super().__init__(str(path), Handler)
+
+    def watch(self, handler):
+        """keep the connection and push every status change down it until the client hangs up"""
+        handler.send(dict(status=self.timeclock.report()))
+        with self.watch_lock:
+            self.watchers.append(handler)
+        handler.rfile.read() # returns when the client disconnects
+        with self.watch_lock:
+            self.watchers.remove(handler)
+
+    def broadcast(self, text):
+        with self.watch_lock:
+            for handler in self.watchers:
+                try:
+                    handler.send(dict(status=text))
+                except OSError:
+                    pass # gone; its handler thread cleans up
+
+def claim_socket(path=SOCKET_FILE):
+    """remove a socket left behind by a daemon that died; refuse if one is running"""
+    if not path.exists():
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(path))
+    except OSError:
+        path.unlink()
+    else:
+        sys.exit(f"a timekeeper daemon is already running on {path}")
+
+def main():
+    if not hasattr(socket, "AF_UNIX"):
+        sys.exit("the daemon needs unix domain sockets, which this system does not have")
+    claim_socket()
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit()) # shut down through the finally below
+    server = DaemonServer()
+    print("timekeeper daemon listening on", SOCKET_FILE)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        SOCKET_FILE.unlink(missing_ok=True)
+        server.timeclock.clock_out()
+        server.timeclock.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+The timekeeper's log. Lines are buffered and written to stderr in batches
+of LOG_BUFFER, or at once for warnings and errors; the last few hundred
+are also kept in memory for the Diagnostics window.
+
+    from logs import get_logger
+    log = get_logger(__name__)
+    log.info("loaded %s", fn)
+"""
+
+import sys
+import logging
+from collections import deque
+from logging.handlers import MemoryHandler
+
+from constants import LOG_LEVEL, LOG_BUFFER
+
+FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+recent = deque(maxlen=300) # formatted lines, newest last
+
+class StderrHandler(logging.StreamHandler):
+    """writes to sys.stderr as it is when the buffer is flushed, not as it was at startup"""
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+class RecentHandler(logging.Handler):
+    def emit(self, record):
+        recent.append(self.format(record))
+
+def root_logger():
+    root = logging.getLogger("timekeeper")
+    if not root.handlers:
+        formatter = logging.Formatter(FORMAT, "%Y-%m-%d %H:%M:%S")
+        stream = StderrHandler()
+        stream.setFormatter(formatter)
+        root.addHandler(MemoryHandler(LOG_BUFFER, flushLevel=logging.WARNING, target=stream))
+        keep = RecentHandler()
+        keep.setFormatter(formatter)
+        root.addHandler(keep)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return root
+
+def get_logger(name):
+    root_logger()
+    return logging.getLogger(f"timekeeper.{name}")
+
+def flush():
+    """write out the buffered lines now"""
+    for handler in root_logger().handlers:
+        handler.flush()
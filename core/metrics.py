@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Timings and counts for the hot paths, kept as histograms with fixed
+buckets. Off unless METRICS is set in constants.py. Then the timed()
+decorator hands back the function untouched, measure() hands back one
+shared do-nothing context manager and count() returns straight away.
+
+When on, the numbers are shown in the Diagnostics window and written
+to METRICS_FILE in the Prometheus text format, for node_exporter's
+textfile collector or just for reading.
+"""
+
+import os
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from contextlib import nullcontext
+
+from constants import METRICS, METRICS_FILE
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10) # seconds
+PREFIX = "timekeeper_"
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # the last one is everything above BUCKETS[-1]
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """upper bound of the bucket the q quantile falls in"""
+        wanted = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max)
+        return self.max
+
+histograms = {}
+counters = {}
+lock = Lock()
+
+def observe(name, seconds):
+    with lock:
+        if (hist := histograms.get(name)) is None:
+            hist = histograms[name] = Histogram()
+        hist.observe(seconds)
+
+def count(name, amount=1):
+    if not METRICS:
+        return
+    with lock:
+        counters[name] = counters.get(name, 0) + amount
+
+def timed(name):
+    """decorator that records how long each call takes, under name"""
+    def decorate(func):
+        if not METRICS:
+            return func
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, perf_counter() - start)
+        return wrapper
+    return decorate
+
+class Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        observe(self.name, perf_counter() - self.start)
+
+NOTHING = nullcontext()
+
+def measure(name):
+    """with measure("save"): ... records how long the block takes"""
+    return Timer(name) if METRICS else NOTHING
+
+def render():
+    """everything in the Prometheus text format"""
+    lines = []
+    with lock:
+        for name, hist in sorted(histograms.items()):
+            metric = f"{PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), hist.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum {hist.sum:.6f}")
+            lines.append(f"{metric}_count {hist.count}")
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE {PREFIX}{name}_total counter")
+            lines.append(f"{PREFIX}{name}_total {value}")
+    return "\n".join(lines) + "\n"
+
+def summary():
+    """a table for people"""
+    if not METRICS:
+        return "Metrics are off. Set METRICS = True in constants.py to record them."
+    lines = [f"{'':<16}{'count':>7}{'mean ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"]
+    with lock:
+        for name, hist in sorted(histograms.items()):
+            lines.append(f"{name:<16}{hist.count:>7}{hist.sum/hist.count*1000:>10.2f}"
+                f"{hist.quantile(.5)*1000:>9.2f}{hist.quantile(.95)*1000:>9.2f}{hist.max*1000:>9.2f}")
+        for name, value in sorted(counters.items()):
+            lines.append(f"{name:<16}{value:>7}")
+    return "\n".join(lines)
+
+def write_file(fn=METRICS_FILE):
+    tmp = fn.with_name(fn.name + ".tmp")
+    tmp.write_text(render())
+    os.replace(tmp, fn)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+"""
+The timedata in memory. On disk it is {"YYYY-MM-DD": {"task": minutes,
+"task_RESET": true}}; in memory every day is a Day record keyed by its
+date ordinal, task names are interned to small ints once, and the billing
+flags are kept apart from the minutes instead of as fake "_RESET" keys.
+
+TimeData still behaves like the old dict of dicts (a day string gives a
+dict-like view of that day), so the stores, the journal and anything else
+written against the json layout keep working. The reports use the native
+methods and never parse a date string or filter a _RESET key.
+"""
+
+from array import array
+from collections.abc import MutableMapping
+from datetime import date, datetime
+
+from constants import RESET
+
+RESET_SUFFIX = RESET.format("")
+
+class Tasks:
+    """intern table: each task name gets a small int id, once per process"""
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def id(self, name):
+        if (task_id := self.ids.get(name)) is None:
+            task_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return task_id
+
+    def get(self, name):
+        """the id, or None for a name never seen"""
+        return self.ids.get(name)
+
+TASKS = Tasks()
+
+def day_ordinal(day):
+    """"2024-05-08" -> date ordinal, without the cost of strptime"""
+    return date.fromisoformat(day).toordinal()
+
+def day_string(ordinal):
+    return date.fromordinal(ordinal).isoformat() # same as DAY_FMT
+
+def bad_minutes(day, task, minutes):
+    return ValueError(f"{day} {task}: minutes must be a whole number, not {minutes!r}")
+
+class Day:
+    """
+    one day: the minutes per task as a flat array [task id, minutes,
+    task id, minutes, ...] and a tuple of the task ids billed that day.
+    Minutes are signed 32 bit ints; anything else raises TypeError or
+    OverflowError and leaves the day as it was.
+    """
+    __slots__ = ("entries", "resets")
+
+    def __init__(self):
+        self.entries = array('i')
+        self.resets = ()
+
+    @classmethod
+    def from_dict(cls, times, day=None):
+        """a Day from the json layout; day is only used in the error for bad minutes"""
+        task_id = TASKS.id
+        entries = []
+        resets = []
+        for key, value in times.items():
+            if value is True and key.endswith(RESET_SUFFIX):
+                resets.append(task_id(key[:-len(RESET_SUFFIX)]))
+            else:
+                entries += (task_id(key), value)
+        record = cls()
+        try:
+            record.entries = array('i', entries)
+        except (TypeError, OverflowError):
+            for task_id, minutes in zip(entries[0::2], entries[1::2]):
+                try:
+                    array('i', (minutes,))
+                except (TypeError, OverflowError):
+                    raise bad_minutes(day, TASKS.names[task_id], minutes) from None
+            raise
+        record.resets = tuple(resets)
+        return record
+
+    def find(self, task_id):
+        entries = self.entries
+        for i in range(0, len(entries), 2):
+            if entries[i] == task_id:
+                return i
+        return -1
+
+    def minutes(self, task_id):
+        """the minutes logged on task_id, or None if it has no entry"""
+        i = self.find(task_id)
+        return self.entries[i+1] if i >= 0 else None
+
+    def add(self, task_id, minutes):
+        if (i := self.find(task_id)) >= 0:
+            self.entries[i+1] += minutes
+        else:
+            self.entries.extend(array('i', (task_id, minutes))) # all or nothing
+
+    def set(self, task_id, minutes):
+        if (i := self.find(task_id)) >= 0:
+            self.entries[i+1] = minutes
+        else:
+            self.entries.extend(array('i', (task_id, minutes)))
+
+    def remove(self, task_id):
+        if (i := self.find(task_id)) < 0:
+            raise KeyError(task_id)
+        del self.entries[i:i+2]
+
+    def bill(self, task_id):
+        """mark task_id billed; False if it already was"""
+        if task_id in self.resets:
+            return False
+        self.resets += (task_id,)
+        return True
+
+    def items(self):
+        """(task id, minutes)"""
+        entries = self.entries
+        return zip(entries[0::2], entries[1::2])
+
+    def to_dict(self):
+        names = TASKS.names
+        times = {names[task_id]: minutes for task_id, minutes in self.items()}
+        for task_id in self.resets:
+            times[RESET.format(names[task_id])] = True
+        return times
+
+class DayView(MutableMapping):
+    """a Day as the old {"task": minutes, "task_RESET": True} dict"""
+    __slots__ = ("day", "ordinal")
+
+    def __init__(self, day, ordinal):
+        self.day = day
+        self.ordinal = ordinal
+
+    def __getitem__(self, key):
+        task_id = TASKS.get(key)
+        if task_id is not None and (minutes := self.day.minutes(task_id)) is not None:
+            return minutes
+        if key.endswith(RESET_SUFFIX) and TASKS.get(key[:-len(RESET_SUFFIX)]) in self.day.resets:
+            return True
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if value is True and key.endswith(RESET_SUFFIX):
+            self.day.bill(TASKS.id(key[:-len(RESET_SUFFIX)]))
+        else:
+            try:
+                self.day.set(TASKS.id(key), value)
+            except (TypeError, OverflowError):
+                raise bad_minutes(day_string(self.ordinal), key, value) from None
+
+    def __delitem__(self, key):
+        task_id = TASKS.get(key)
+        if task_id is not None and self.day.find(task_id) >= 0:
+            self.day.remove(task_id)
+        elif key.endswith(RESET_SUFFIX) and (task_id := TASKS.get(key[:-len(RESET_SUFFIX)])) in self.day.resets:
+            self.day.resets = tuple(t for t in self.day.resets if t != task_id)
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        names = TASKS.names
+        for task_id in self.day.entries[0::2]:
+            yield names[task_id]
+        for task_id in self.day.resets:
+            yield names[task_id] + RESET_SUFFIX
+
+    def __len__(self):
+        return len(self.day.entries) // 2 + len(self.day.resets)
+
+    def __repr__(self):
+        return repr(self.day.to_dict())
+
+class TimeData(MutableMapping):
+    """date ordinal -> Day, looking like the old {day string: {key: value}} dict from outside"""
+    def __init__(self, data=()):
+        self.days = {}
+        for day, times in dict(data).items():
+            self.days[day_ordinal(day)] = Day.from_dict(times, day)
+
+    # the old dict layout
+    def __getitem__(self, day):
+        ordinal = day_ordinal(day)
+        return DayView(self.days[ordinal], ordinal)
+
+    def __setitem__(self, day, times):
+        self.days[day_ordinal(day)] = Day.from_dict(times, day)
+
+    def __delitem__(self, day):
+        del self.days[day_ordinal(day)]
+
+    def __iter__(self):
+        return map(day_string, self.days)
+
+    def __len__(self):
+        return len(self.days)
+
+    def __contains__(self, day):
+        return day_ordinal(day) in self.days
+
+    def setdefault(self, day, default=None):
+        ordinal = day_ordinal(day)
+        if ordinal not in self.days:
+            self[day] = default or {}
+        return DayView(self.days[ordinal], ordinal)
+
+    def __repr__(self):
+        return f"TimeData({self.to_dict()!r})"
+
+    # native
+    def record(self, day):
+        """the Day for a day string, made if needed"""
+        ordinal = day_ordinal(day)
+        if (record := self.days.get(ordinal)) is None:
+            record = self.days[ordinal] = Day()
+        return record
+
+    def add(self, day, task, minutes):
+        try:
+            self.record(day).add(TASKS.id(task), minutes)
+        except (TypeError, OverflowError):
+            raise bad_minutes(day, task, minutes) from None
+
+    def bill(self, day, task):
+        """mark task billed on day; False if it already was"""
+        return self.record(day).bill(TASKS.id(task))
+
+    def minutes(self, day, task):
+        """minutes on task that day; 0 if none"""
+        record = self.days.get(day_ordinal(day))
+        task_id = TASKS.get(task)
+        if record is None or task_id is None:
+            return 0
+        return record.minutes(task_id) or 0
+
+    def to_dict(self):
+        """the json layout, days in date order"""
+        return {day_string(ordinal): self.days[ordinal].to_dict() for ordinal in sorted(self.days)}
+
+    def entries(self):
+        """(ordinal, task id, minutes) for every logged time and (ordinal, task id, None) for every billpoint"""
+        for ordinal, record in self.days.items():
+            for task_id, minutes in record.items():
+                yield ordinal, task_id, minutes
+            for task_id in record.resets:
+                yield ordinal, task_id, None
+
+    def task_days(self, task, since=None):
+        """({date: minutes}, [reset dates]) for one task, only after the date since if given"""
+        days = {}
+        resets = []
+        task_id = TASKS.get(task)
+        if task_id is None:
+            return days, resets
+        after = since.toordinal() if since else 0
+        for ordinal, record in self.days.items():
+            if ordinal <= after:
+                continue
+            if (minutes := record.minutes(task_id)):
+                days[date.fromordinal(ordinal)] = minutes
+            if task_id in record.resets:
+                resets.append(date.fromordinal(ordinal))
+        return days, resets
+
+    def month_days(self):
+        """{datetime: {project: minutes, "project_RESET": True}} for all days"""
+        return {datetime.fromordinal(ordinal): record.to_dict() for ordinal, record in self.days.items()}
+
+def as_timedata(data):
+    return data if isinstance(data, TimeData) else TimeData(data)
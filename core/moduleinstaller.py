@@ -28,7 +28,7 @@ But is also allowed for CLI programs that want a GUI prompt.
 ALTERNATE USE:
 pass in a string of modules to be installed, or leave
   blank to use requirements.txt file from the same folder.
-This alternate method is MUCH SLOWER than the dictionary method.
+This checks the installed package metadata instead of looking for the import.
 
     import moduleinstaller
     moduleinstaller.cli_check_and_prompt("pillow openpyxl")
@@ -38,7 +38,9 @@ or
     import moduleinstaller
     moduleinstaller.cli_check_and_prompt() # use requirements.txt
 
-You can get the speed advantage back if you wrap your attempted import
+Either way the verdict is cached (see CACHE_FILE) until the interpreter or
+its site-packages folders change, so repeat launches skip the check.
+You can skip even that if you wrap your attempted import
 
     try:
         from PIL import Image
@@ -64,47 +66,200 @@ Normal pip versioning strings can be used. For example
 or
 
     import moduleinstaller
-    moduleinstaller.cli_check_and_prompt("pyserial pillow openpyxl==2.2")
+    moduleinstaller.cli_check_and_prompt("pyserial pillow openpyxl>=2.2,<3")
+
+---
+
+OFFLINE INSTALL:
+If there is a "wheelhouse" folder next to this file, or the MODULEINSTALLER_WHEELHOUSE
+environment variable names one, modules are installed from the wheels in there
+without touching the network (pip install --no-index --find-links ...).
+Fill it on a connected computer with:
+
+    python -m pip download -d wheelhouse pillow openpyxl
 
 """
 
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+CACHE_FILE = Path(tempfile.gettempdir()) / "moduleinstaller_cache.json"
+CACHE_SIZE = 20 # verdicts kept, newest first
+WHEELHOUSE = Path(os.environ.get("MODULEINSTALLER_WHEELHOUSE", Path(__file__).parent / "wheelhouse"))
+
+REQUIREMENT = re.compile(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*\(?([^;)]*)\)?\s*(;.*)?$")
+SPECIFIER = re.compile(r"\s*(===|==|!=|~=|>=|<=|>|<)\s*([^\s,]+)\s*$")
+
+def parse_requirement(text:str):
+    """'openpyxl>=2.2,<3' -> ('openpyxl', [('>=', '2.2'), ('<', '3')]); environment markers are ignored"""
+    match = REQUIREMENT.match(text)
+    if not match:
+        raise ValueError(f"can't parse requirement {text!r}")
+    name, _extras, specs, _marker = match.groups()
+    specifiers = []
+    for spec in filter(str.strip, specs.split(",")):
+        if not (m := SPECIFIER.match(spec)):
+            raise ValueError(f"can't parse version specifier {spec!r} in {text!r}")
+        specifiers.append(m.groups())
+    return name, specifiers
+
+RELEASE = re.compile(r"v?(\d+(?:\.\d+)*)(.*)")
+SUFFIX = re.compile(r"(?:[-_.]?(a|alpha|b|beta|c|rc|pre|preview)[-_.]?(\d*))?"
+    r"(?:[-_.]?(post|rev|r)[-_.]?(\d*)|-(\d+))?(?:[-_.]?(dev)[-_.]?(\d*))?(?:\+.*)?$")
+PHASES = {"a": 0, "alpha": 0, "b": 1, "beta": 1, "c": 2, "rc": 2, "pre": 2, "preview": 2}
+FINAL = 3
+NO_DEV = float("inf")
+
+def release(version:str):
+    """the release numbers as written, so 2.0 is (2, 0); () if not a version"""
+    match = RELEASE.match(version.strip().lower())
+    return tuple(int(n) for n in match.group(1).split(".")) if match else ()
+
+def prefix_match(version:str, prefix:tuple) -> bool:
+    """whether the release of version starts with prefix, padding it with zeros (2 matches 2.0.*)"""
+    have = release(version)
+    have += (0,) * (len(prefix) - len(have))
+    return bool(prefix) and have[:len(prefix)] == prefix
+
+def version_key(version:str):
+    """
+    a sortable key for a version string, as in PEP 440: the release numbers,
+    then dev < a < b < rc < final < post, each phase with its number
+    """
+    match = RELEASE.match(version.strip().lower())
+    if not match or not (suffix := SUFFIX.match(match.group(2))):
+        return (), (-2, 0), -1, NO_DEV # not a version; below all real ones
+    release = [int(n) for n in match.group(1).split(".")]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop() # 2.0 == 2
+    phase, pre, post_word, post, implicit_post, dev_word, dev = suffix.groups()
+    if phase:
+        pre_key = PHASES[phase], int(pre or 0)
+    elif dev_word and not (post_word or implicit_post):
+        pre_key = -1, 0 # 2.0.dev1 comes before 2.0a1
+    else:
+        pre_key = FINAL, 0
+    post_key = int(post or implicit_post or 0) if (post_word or implicit_post) else -1
+    dev_key = int(dev or 0) if dev_word else NO_DEV
+    return tuple(release), pre_key, post_key, dev_key
+
+def version_matches(version:str, op:str, wanted:str) -> bool:
+    if op == "===":
+        return version == wanted
+    if op in ("==", "!=") and wanted.endswith(".*"):
+        hit = prefix_match(version, release(wanted[:-2]))
+        return hit if op == "==" else not hit
+    have, want = version_key(version), version_key(wanted)
+    if op == "~=": # ~=2.2 means >=2.2,==2.*
+        return have >= want and prefix_match(version, release(wanted)[:-1])
+    return dict(zip(("==", "!=", ">=", "<=", ">", "<"),
+        (have == want, have != want, have >= want, have <= want, have > want, have < want)))[op]
+
+def installed_version(name:str):
+    """the installed version of a distribution, or None"""
+    from importlib import metadata
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+def satisfied(requirement:str) -> bool:
+    name, specifiers = parse_requirement(requirement)
+    version = installed_version(name)
+    if version is None:
+        return False
+    return all(version_matches(version, op, wanted) for op, wanted in specifiers)
+
+def environment_key(install) -> str:
+    """changes whenever the interpreter, its site-packages or the list of modules changes"""
+    import hashlib
+    folders = [path for path in sys.path if path.endswith(("site-packages", "dist-packages"))]
+    mtimes = []
+    for folder in folders:
+        try:
+            mtimes.append(os.stat(folder).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    key = repr((sys.executable, sys.version, folders, mtimes, install))
+    return hashlib.sha1(key.encode()).hexdigest()
+
 class ModuleInstallerCore:
     __version__ = 2024,5,8
 
     def find_missing(self, install:str|dict=None):
+        if isinstance(install, (str, type(None))) or hasattr(install, "read_text"):
+            install = self.read_install_list(install)
+        key = environment_key(install)
+        if (missing := self.cached(key)) is not None:
+            return missing
         if isinstance(install, dict):
-            return self.find_missing_via_imports(install)
+            missing = self.find_missing_via_imports(install)
         else: # string, None, or Path
-            return self.find_missing_via_pip(install)
+            missing = self.find_missing_via_metadata(install)
+        self.store_cache(key, missing)
+        return missing
 
-    def find_missing_via_pip(self, install:str=None) -> dict:
-        import subprocess
-        import sys
-        from pathlib import Path
-        to_be_installed = []
+    def read_install_list(self, install=None) -> str:
         if install is None:
-            req = Path(__file__).parent / "requirements.txt"
-            if req.exists():
-                install = req.read_text()
-            else:
-                raise FileNotFoundError(f"No module list supplied and no requirements.txt found at {req}")
-        resp = subprocess.run([sys.executable, '-m', 'pip', 'freeze'], capture_output=True)
-        installed = resp.stdout.decode().splitlines()
-        for modulename in install.strip().split():
-            if not any(line.startswith(modulename) for line in installed):
-                to_be_installed.append(modulename)
-        return to_be_installed
-
-    def find_missing_via_imports(self, install:dict) -> dict:
+            install = Path(__file__).parent / "requirements.txt"
+            if not install.exists():
+                raise FileNotFoundError(f"No module list supplied and no requirements.txt found at {install}")
+        if hasattr(install, "read_text"):
+            install = install.read_text()
+        # one requirement per line or space separated; comments and pip options are skipped
+        lines = (line.split("#")[0].strip() for line in install.splitlines())
+        return " ".join(line for line in lines if line and not line.startswith("-"))
+
+    def cached(self, key):
+        import json
+        try:
+            return json.loads(CACHE_FILE.read_text()).get(key)
+        except (OSError, ValueError):
+            return None
+
+    def store_cache(self, key, missing):
+        import json
+        try:
+            cache = json.loads(CACHE_FILE.read_text())
+        except (OSError, ValueError):
+            cache = {}
+        cache.pop(key, None)
+        cache = dict([(key, missing)] + list(cache.items())[:CACHE_SIZE-1])
+        try:
+            CACHE_FILE.write_text(json.dumps(cache))
+        except OSError:
+            pass # no cache then; the next launch checks again
+
+    def find_missing_via_metadata(self, install:str) -> list:
+        # requirements are space separated, so no spaces inside one ("openpyxl>=2.2,<3")
+        return [requirement for requirement in install.split() if not satisfied(requirement)]
+
+    find_missing_via_pip = find_missing_via_metadata # old name
+
+    def find_missing_via_imports(self, install:dict) -> list:
         # install is a dict of  {importname:installname}
+        # find_spec only locates the module, it does not run it
+        from importlib.util import find_spec
         to_be_installed = []
         for importname, installname in install.items():
             try:
-                __import__(importname)
-            except (ImportError, ModuleNotFoundError):
+                found = find_spec(importname) is not None
+            except (ImportError, ValueError):
+                found = False
+            # a version pin in the installname is checked against the metadata too
+            if not found or (parse_requirement(installname)[1] and not satisfied(installname)):
                 to_be_installed.append(installname)
         return to_be_installed
 
+    def pip_install_command(self, modules:list) -> list:
+        command = [sys.executable, '-m', 'pip', 'install']
+        if WHEELHOUSE.is_dir():
+            command += ['--no-index', '--find-links', str(WHEELHOUSE)]
+        return command + modules
+
 class ModuleInstallerGUI(ModuleInstallerCore):
     def __init__(self, install:str|dict=None, force_kill:bool=True) -> None:
         if (modules := self.find_missing(install)): # if modules are missing
@@ -122,7 +277,6 @@ class ModuleInstallerGUI(ModuleInstallerCore):
 
     def install_gui(self, modules:list):
         from subprocess import Popen, PIPE
-        import sys
         import threading
         import tkinter as tk
         from tkinter import ttk
@@ -146,7 +300,7 @@ class ModuleInstallerGUI(ModuleInstallerCore):
         tk.Label(root, text=f'Installing: {", ".join(modules)}', font=('bold',14)).pack()
         st= ScrolledText(root, width=60, height=12)
         st.pack(expand=True, fill=tk.BOTH)
-        sub_proc = Popen([sys.executable, '-m', 'pip', 'install'] + modules, stdout=PIPE, stderr=PIPE)
+        sub_proc = Popen(self.pip_install_command(modules), stdout=PIPE, stderr=PIPE)
         threading.Thread(target=pipe_reader, args=[sub_proc.stdout]).start()
         threading.Thread(target=pipe_reader, args=[sub_proc.stderr, True]).start()
         root.mainloop()
@@ -168,9 +322,8 @@ class ModuleInstallerCLI(ModuleInstallerCore):
 
     def install_cli(self, modules:list):
         import subprocess
-        import sys
 
-        subprocess.run([sys.executable, '-m', 'pip', 'install'] + modules)
+        subprocess.run(self.pip_install_command(modules))
         print()
         print("DONE. Restart required.")
         input("press enter to complete")
@@ -194,7 +347,7 @@ def test():
     ModuleInstallerGUI({"pandas":"pillow"})
     # ~ ModuleInstallerCLI({"pandas":"pillow"})
     # ~ gui_check_and_prompt({"serial":"pyserial"})
-    # ~ print(find_missing_via_pip("pyserial pillow openpyxl==2.2"))
+    # ~ print(ModuleInstallerCore().find_missing("pyserial pillow openpyxl==2.2"))
 
 if __name__ == "__main__":
     test()
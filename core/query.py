@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+"""
+Totals as rows instead of report text, for dashboards and scripts:
+
+    timeclock.query("2024-04-01", "2024-06-30", group_by="week")
+    [QueryRow(period='2024-W14', task='TASK 1', minutes=380), ...]
+
+Rows are summed per task and per day, ISO week, month or quarter; with
+group_by="task" the period is None and there is one row per task. Start
+and end are dates, datetimes or DAY_FMT strings and are both included.
+"""
+
+from collections import namedtuple
+from datetime import date
+
+GROUPS = {
+    "day": lambda day: day.isoformat(),
+    "week": lambda day: "{}-W{:02}".format(*day.isocalendar()[:2]),
+    "month": lambda day: f"{day.year}-{day.month:02}",
+    "quarter": lambda day: f"{day.year}-Q{(day.month-1)//3 + 1}",
+    "task": lambda day: None,
+    }
+
+class QueryRow(namedtuple("QueryRow", "period task minutes")):
+    __slots__ = ()
+
+    @property
+    def hours(self):
+        return self.minutes / 60
+
+def run_query(index, start=None, end=None, tasks=None, group_by="task"):
+    """the rows from a TimeIndex, sorted by period and task"""
+    if group_by not in GROUPS:
+        raise ValueError(f"can't group by {group_by!r}; use one of {', '.join(GROUPS)}")
+    period_of = GROUPS[group_by]
+    periods = {} # day ordinal: period, shared by all tasks
+    totals = {}
+    for task in (index.ordinals if tasks is None else tasks):
+        for ordinal, minutes in index.day_totals(task, start, end):
+            if not minutes:
+                continue
+            if (period := periods.get(ordinal, ...)) is ...:
+                period = periods[ordinal] = period_of(date.fromordinal(ordinal))
+            totals[period, task] = totals.get((period, task), 0) + minutes
+    return tuple(QueryRow(period, task, minutes) for (period, task), minutes
+        in sorted(totals.items(), key=lambda item: (item[0][0] or "", item[0][1])))
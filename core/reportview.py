@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+"""
+Report viewer for long histories. The report is made on a ReportWorker
+thread from the timeclock's row generators and handed to the dialog in
+batches through wx.CallAfter, so the dialog opens at once, fills in as
+the rows come and can be cancelled; the clock keeps ticking and the
+buttons keep working meanwhile. The list is virtual, so wx only asks for
+the text of the rows on screen.
+"""
+
+import time
+from datetime import datetime
+from threading import Thread, Event
+
+import wx
+
+from constants import DAY_FMT, METRICS
+import metrics
+from logs import get_logger
+
+log = get_logger("reportview")
+
+PAGE = 200 # rows handed over at a time
+COLUMN_WIDTHS = (200, 80, 80, 80, 80) # rows are tab separated; the task report has 5 fields
+
+class ReportWorker(Thread):
+    """
+    runs rows(), a report's row generator, and choices(), if given, off the
+    event thread and sends what they make to the dialog's set_choices,
+    add_rows and report_done through wx.CallAfter
+    """
+    def __init__(self, dialog, rows, choices=None):
+        super().__init__(name="report", daemon=True)
+        self.dialog = dialog
+        self.rows = rows
+        self.choices = choices
+        self.cancelled = Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def send(self, method, *args):
+        if not self.cancelled.is_set():
+            wx.CallAfter(method, self, *args)
+
+    def run(self):
+        try:
+            if self.choices:
+                self.send(self.dialog.set_choices, *self.choices())
+            batch = []
+            for row in self.rows():
+                if self.cancelled.is_set():
+                    return
+                batch.append(row)
+                if len(batch) == PAGE:
+                    self.send(self.dialog.add_rows, batch)
+                    batch = []
+            self.send(self.dialog.add_rows, batch)
+            self.send(self.dialog.report_done, None)
+        except Exception as e:
+            log.exception("report failed")
+            self.send(self.dialog.report_done, f"{type(e).__name__}: {e}")
+
+class ReportList(wx.ListCtrl):
+    def __init__(self, parent):
+        super().__init__(parent, wx.ID_ANY, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_NO_HEADER | wx.LC_HRULES)
+        for col, width in enumerate(COLUMN_WIDTHS):
+            self.InsertColumn(col, "", width=width)
+        self.rows = []
+        self.Bind(wx.EVT_KEY_DOWN, self.on_key)
+
+    def clear(self):
+        self.rows = []
+        self.SetItemCount(0)
+        self.Refresh()
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+        self.SetItemCount(len(self.rows))
+        self.Refresh()
+
+    def OnGetItemText(self, item, col):
+        fields = self.rows[item].split("\t") if item < len(self.rows) else [""]
+        return fields[col] if col < len(fields) else ""
+
+    def find(self, match, start=0):
+        """index of the first row from start on that match(row) is true for, or None"""
+        for idx in range(start, len(self.rows)):
+            if match(self.rows[idx]):
+                return idx
+        return None
+
+    def jump_to(self, idx):
+        self.Select(idx)
+        self.Focus(idx)
+        self.EnsureVisible(idx)
+
+    def on_key(self, event):
+        if event.ControlDown() and event.GetKeyCode() == ord('C'):
+            self.copy_selection()
+        else:
+            event.Skip()
+
+    def copy_selection(self):
+        idx = self.GetFirstSelected()
+        lines = []
+        while idx != -1:
+            lines.append(self.rows[idx])
+            idx = self.GetNextSelected(idx)
+        if lines and wx.TheClipboard.Open():
+            wx.TheClipboard.SetData(wx.TextDataObject("\n".join(lines)))
+            wx.TheClipboard.Close()
+
+class ReportDialog(wx.Dialog):
+    """
+    the month report (task=None) with month and task filters, or the
+    report for one task; both can jump to a date. Modeless: show it with
+    Show(), it destroys itself when closed. metric names the time from
+    opening to the last row, when METRICS is on.
+    """
+    ALL = "All"
+
+    def __init__(self, parent, timeclock, task=None, billed_callback=None, metric=None):
+        super().__init__(parent, wx.ID_ANY, style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        self.timeclock = timeclock
+        self.task = task
+        self.billed_callback = billed_callback
+        self.metric = metric
+        self.worker = None
+        self.jump_day = None # go here once the rows for it are in
+        self.searched = 0 # rows already searched for jump_day
+        self.SetSize((500, 600))
+        self.SetTitle(f"Times for {task}" if task else "Times by Month")
+
+        sizer_1 = wx.StaticBoxSizer(wx.StaticBox(self, wx.ID_ANY, "Task times" if task else "Month total times"), wx.VERTICAL)
+
+        filters = wx.BoxSizer(wx.HORIZONTAL)
+        sizer_1.Add(filters, 0, wx.EXPAND | wx.BOTTOM, 3)
+        if not task:
+            # filled in by the worker; finding the months and tasks needs the whole history
+            self.month_choice = wx.Choice(self, wx.ID_ANY, choices=[self.ALL])
+            self.task_choice = wx.Choice(self, wx.ID_ANY, choices=[self.ALL])
+            for label, choice in (("Month", self.month_choice), ("Task", self.task_choice)):
+                choice.SetSelection(0)
+                choice.Disable()
+                choice.Bind(wx.EVT_CHOICE, self.refresh)
+                filters.Add(wx.StaticText(self, wx.ID_ANY, label), 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 3)
+                filters.Add(choice, 0, wx.ALL, 3)
+        filters.AddStretchSpacer()
+        self.date = wx.TextCtrl(self, wx.ID_ANY, "", size=(100, -1), style=wx.TE_PROCESS_ENTER)
+        self.date.SetHint(datetime.today().strftime(DAY_FMT))
+        self.date.Bind(wx.EVT_TEXT_ENTER, self.on_jump)
+        jump = wx.Button(self, wx.ID_ANY, "Go to date", style=wx.BU_EXACTFIT)
+        jump.Bind(wx.EVT_BUTTON, self.on_jump)
+        filters.Add(self.date, 0, wx.ALL, 3)
+        filters.Add(jump, 0, wx.ALL, 3)
+
+        self.data = ReportList(self)
+        sizer_1.Add(self.data, 1, wx.EXPAND, 0)
+
+        progress = wx.BoxSizer(wx.HORIZONTAL)
+        sizer_1.Add(progress, 0, wx.EXPAND | wx.TOP, 3)
+        self.gauge = wx.Gauge(self, wx.ID_ANY, 100, size=(120, -1))
+        self.progress_text = wx.StaticText(self, wx.ID_ANY, "")
+        self.cancel = wx.Button(self, wx.ID_ANY, "Cancel", style=wx.BU_EXACTFIT)
+        self.cancel.Bind(wx.EVT_BUTTON, self.on_cancel)
+        progress.Add(self.gauge, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 3)
+        progress.Add(self.progress_text, 1, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 3)
+        progress.Add(self.cancel, 0, wx.ALL, 3)
+        self.pulse = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, lambda evt: self.gauge.Pulse(), self.pulse)
+
+        self.button_1 = wx.Button(self, wx.ID_ANY, "Close")
+        sizer_1.Add(self.button_1, 0, wx.ALIGN_CENTER_HORIZONTAL | wx.ALL, 3)
+        self.Bind(wx.EVT_BUTTON, lambda evt:self.Close(), self.button_1)
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+
+        if billed_callback:
+            billed = wx.Button(self, wx.ID_ANY, "Set this as billed today.")
+            sizer_1.Add(billed, 0, wx.ALIGN_CENTER_HORIZONTAL | wx.ALL, 3)
+            billed.Bind(wx.EVT_BUTTON, self.on_billed)
+
+        self.SetSizer(sizer_1)
+        self.Layout()
+        self.refresh()
+
+    def selected(self, choice):
+        value = choice.GetStringSelection()
+        return None if value == self.ALL else value
+
+    def refresh(self, event=None):
+        """start making the report over, for the current filters"""
+        self.stop()
+        self.data.clear()
+        self.searched = 0
+        self.started = time.perf_counter()
+        if self.task:
+            task = self.task
+            self.worker = ReportWorker(self, lambda: self.timeclock.taskreport_rows(task))
+        else:
+            month, task = self.selected(self.month_choice), self.selected(self.task_choice)
+            choices = None if self.month_choice.IsEnabled() else (
+                lambda: (self.timeclock.report_months(), self.timeclock.report_tasks()))
+            self.worker = ReportWorker(self, lambda: self.timeclock.monthreport_rows(month=month, task=task), choices)
+        self.progress_text.SetLabel("Making the report ...")
+        self.cancel.Enable()
+        self.pulse.Start(100)
+        self.worker.start()
+
+    def stop(self):
+        if self.worker:
+            self.worker.cancel()
+            self.worker = None
+        self.pulse.Stop()
+        self.gauge.SetValue(0)
+        self.cancel.Disable()
+
+    def current(self, worker):
+        """is this still the dialog and the worker it is waiting for"""
+        return bool(self) and worker is self.worker
+
+    def set_choices(self, worker, months, tasks):
+        if not self.current(worker):
+            return
+        for choice, items in ((self.month_choice, months), (self.task_choice, tasks)):
+            choice.Set([self.ALL] + items)
+            choice.SetSelection(0)
+            choice.Enable()
+
+    def add_rows(self, worker, rows):
+        if not self.current(worker):
+            return
+        self.data.extend(rows)
+        self.progress_text.SetLabel(f"Making the report ... {len(self.data.rows)} lines")
+        if self.jump_day:
+            self.try_jump()
+
+    def report_done(self, worker, error):
+        if not self.current(worker):
+            return
+        self.stop()
+        if error:
+            self.progress_text.SetLabel(f"The report failed: {error}")
+            return
+        self.gauge.SetValue(self.gauge.GetRange())
+        self.progress_text.SetLabel(f"{len(self.data.rows)} lines")
+        if METRICS and self.metric:
+            metrics.observe(self.metric, time.perf_counter() - self.started)
+        if self.jump_day:
+            self.try_jump()
+
+    def on_cancel(self, event=None):
+        self.stop()
+        self.progress_text.SetLabel(f"Cancelled after {len(self.data.rows)} lines")
+        self.jump_day = None
+
+    def on_jump(self, event=None):
+        text = self.date.GetValue().strip()
+        try:
+            day = datetime.strptime(text, DAY_FMT).strftime(DAY_FMT)
+        except ValueError:
+            wx.Bell()
+            return
+        self.jump_day = day
+        self.searched = 0
+        if not self.task and self.selected(self.month_choice) not in (None, day[:7]):
+            self.month_choice.SetSelection(0) # the date is in another month
+            self.refresh()
+        else:
+            self.try_jump()
+
+    def try_jump(self):
+        """jump to jump_day if its row is in; give up once the report is done without it"""
+        day = self.jump_day
+        if self.task: # the task report puts a line number before the date
+            idx = self.data.find(lambda row: row.split("\t")[1:2] == [day], self.searched)
+        else:
+            idx = self.data.find(lambda row: row.split("\t", 1)[0] == day, self.searched)
+        self.searched = len(self.data.rows)
+        if idx is not None:
+            self.jump_day = None
+            self.data.jump_to(idx)
+        elif self.worker is None:
+            self.jump_day = None
+            wx.Bell()
+
+    def on_billed(self, event=None):
+        self.Close()
+        callback, task = self.billed_callback
+        callback(task)
+
+    def on_close(self, event=None):
+        self.stop()
+        self.Destroy()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import time
+import heapq
+import itertools
+from threading import Thread, Condition
+
+from logs import get_logger
+
+log = get_logger("scheduler")
+
+class Job:
+    def __init__(self, when, func, args, interval=None):
+        self.when = when
+        self.func = func
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Scheduler:
+    """
+    Runs jobs at their due time from a single thread. The thread sleeps
+    until the earliest deadline in the heap, so it only wakes up when
+    there is something to do.
+    """
+    def __init__(self, name="scheduler"):
+        self.heap = []
+        self.cond = Condition()
+        self.counter = itertools.count() # tie breaker, so jobs due at the same time run in order
+        self.thread = Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def call_at(self, when, func, *args, interval=None):
+        """run func(*args) at the time.time() when; returns the Job, which can be cancelled"""
+        job = Job(when, func, args, interval)
+        self.push(job)
+        return job
+
+    def call_later(self, delay, func, *args):
+        return self.call_at(time.time() + delay, func, *args)
+
+    def call_soon(self, func, *args):
+        return self.call_at(time.time(), func, *args)
+
+    def every(self, interval, func, *args, first=0):
+        """run func(*args) every interval seconds, starting after first seconds"""
+        return self.call_at(time.time() + first, func, *args, interval=interval)
+
+    def push(self, job):
+        with self.cond:
+            heapq.heappush(self.heap, (job.when, next(self.counter), job))
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.heap or self.heap[0][0] > time.time():
+                    self.cond.wait(self.heap[0][0] - time.time() if self.heap else None)
+                when, _, job = heapq.heappop(self.heap)
+            if job.cancelled:
+                continue
+            try:
+                job.func(*job.args)
+            except Exception:
+                log.exception("scheduled job %s failed", getattr(job.func, "__qualname__", job.func))
+            if job.interval and not job.cancelled:
+                job.when = max(when + job.interval, time.time())
+                self.push(job)
@@ -0,0 +1,730 @@
+#!/usr/bin/env python3
+
+"""
+Storage backends for the timeclock data.
+
+A store loads the timedata (a model.TimeData) and is told about every change as it happens
+through record(). Saving is split in two so it can run off the UI thread:
+snapshot() is called with the data locked and should only copy what needs
+writing, write() then does the slow part with the lock released.
+What it all does is up to the store:
+
+    json    - the classic layout. The whole history in TIMECLOCK_FILE, rewritten on save.
+    journal - TIMECLOCK_FILE is a snapshot, changes are appended to JOURNAL_FILE as
+              they happen and folded into the snapshot once the journal gets long.
+    sharded - one file per month in DATA_FOLDER plus a manifest. Only the current month
+              is loaded at startup, older months are paged in by load_all() when a
+              report needs them, and a save only rewrites the months that changed.
+    binary  - BINARY_FILE in the columnar format from columnar.py
+    sqlite  - SQLITE_FILE, a sqlite database in WAL mode. Every change is committed as
+              it happens and the reports run indexed queries instead of scanning.
+    nodes   - for running on several computers at once. Each computer keeps a journal
+              of only its own changes in NODES_FOLDER and never writes anyone else's;
+              the data is the merge of all of them.
+
+Switching STORAGE imports the old timedata.json on first use; for anything else use
+
+    python storage.py migrate --from json --to sqlite
+"""
+
+import time
+import json
+import hashlib
+import os
+import re
+import platform
+from threading import Lock
+from contextlib import nullcontext
+from functools import cache
+
+from constants import TIMECLOCK_FILE, BACKUPS, RESET, DAY_FMT
+from constants import STORAGE, JOURNAL_FILE, JOURNAL_COMPACT, DATA_FOLDER, BINARY_FILE, SQLITE_FILE
+from constants import NODES_FOLDER
+from logs import get_logger
+from metrics import timed, count
+from model import TimeData, as_timedata
+
+log = get_logger("storage")
+
+@cache
+@timed("backup")
+def backup():
+    if TIMECLOCK_FILE.exists():
+        if BACKUPS:
+            import backups
+            if backups.backup(TIMECLOCK_FILE.read_bytes()):
+                log.info("timeclock backed up")
+            else:
+                log.info("timeclock unchanged since last backup")
+
+def load_timeclock(fn=TIMECLOCK_FILE):
+    try:
+        with open(fn) as f:
+            data = json.load(f)
+        log.info("loaded timedata file %s", fn)
+    except FileNotFoundError:
+        log.warning("times file not found; creating new one")
+        data = {}
+    return data
+
+def save_timeclock(data, fn=TIMECLOCK_FILE):
+    backup()
+    text = json.dumps(data, indent=2)
+    write_atomic(fn, text)
+    return text
+
+def write_atomic(fn, text, **kwargs):
+    """write to a temp file and swap it in, so a crash never leaves a half written file"""
+    tmp = fn.with_name(fn.name + ".tmp")
+    mode = 'wb' if isinstance(text, bytes) else 'w'
+    with open(tmp, mode, **kwargs) as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, fn)
+
+def apply_change(data, op, day, task, value=1):
+    """apply one recorded change to a timedata dict"""
+    if op == "add":
+        times = data.setdefault(day, {})
+        times[task] = times.get(task, 0) + value
+    elif op == "bill":
+        data.setdefault(day, {})[RESET.format(task)] = True
+    # anything else, eg the "in" lines older journals have for clocking in, changes nothing
+
+def text_hash(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+DAY_LINE = re.compile(r'^  "(\d{4}-\d\d-\d\d)": ', re.M)
+
+def month_chunks(text):
+    """
+    {month: ((day, that day's json), ...)} for a file in the layout
+    json.dumps(indent=2) writes, found without parsing it; None for any other layout
+    """
+    body = text.strip()
+    if body in ("", "{}"):
+        return {}
+    starts = list(DAY_LINE.finditer(body))
+    if not body.startswith("{\n") or not starts:
+        return None
+    months = {}
+    for m, end in zip(starts, [m.start() for m in starts[1:]] + [len(body)-1]): # the last day ends at the final }
+        day = m.group(1)
+        months.setdefault(month_of(day), []).append((day, body[m.end():end].rstrip().rstrip(",")))
+    return {month: tuple(days) for month, days in months.items()}
+
+def file_stat(fn):
+    """(mtime, size), or () if there is no file"""
+    try:
+        stat = fn.stat()
+    except FileNotFoundError:
+        return ()
+    return stat.st_mtime_ns, stat.st_size
+
+def copy_timedata(data):
+    """a plain dict in the json layout"""
+    if isinstance(data, TimeData):
+        return data.to_dict()
+    return {day: dict(times) for day, times in data.items()}
+
+class JsonStore:
+    """
+    The file is watched for changes made by another computer, eg through
+    Dropbox: external_changes() notices them by mtime and finds the months
+    that differ by a hash per month, so only those are parsed, and
+    merge_external() puts them in with the changes made here that are
+    not saved yet applied on top.
+    """
+    stat = None # file_stat() when last read or written here; None for stores that are not watched
+
+    def __init__(self, fn=TIMECLOCK_FILE):
+        self.fn = fn
+        self.last_hash = None
+
+    def load(self):
+        stat = file_stat(self.fn)
+        try:
+            text = self.fn.read_text()
+            data = TimeData(json.loads(text))
+            log.info("loaded timedata file %s", self.fn)
+        except FileNotFoundError:
+            log.warning("times file not found; creating new one")
+            text = ""
+            data = TimeData()
+        self.last_hash = text_hash(text)
+        self.watch(stat, text)
+        return data
+
+    def watch(self, stat, text):
+        """remember the file as it is now, to compare against later"""
+        self.stat = stat
+        self.month_hashes = {month: hash(days) for month, days in (month_chunks(text) or {}).items()}
+        self.pending = [] # changes not written yet
+
+    def record(self, op, day, task, value=1):
+        """called for every change made to the timedata"""
+        if self.stat is not None:
+            self.pending.append((op, day, task, value))
+
+    def record_many(self, changes):
+        """record() for a batch of (op, day, task, value) changes"""
+        for change in changes:
+            self.record(*change)
+
+    def external_changes(self):
+        """
+        {month: {day: times}} for every month that another computer changed
+        in the file since it was last read or written here; empty if none did
+        """
+        if self.stat is None or (stat := file_stat(self.fn)) == self.stat:
+            return {}
+        text = self.fn.read_text()
+        if (new_hash := text_hash(text)) == self.last_hash:
+            self.stat = stat # touched, not changed
+            return {}
+        months = month_chunks(text)
+        if months is None: # written by something else; no telling what changed
+            changed = {}
+            for day, times in json.loads(text).items():
+                changed.setdefault(month_of(day), {})[day] = times
+            hashes = {}
+        else:
+            hashes = {month: hash(days) for month, days in months.items()}
+            changed = {month: {day: json.loads(chunk) for day, chunk in days}
+                for month, days in months.items() if hashes[month] != self.month_hashes.get(month)}
+        for month in self.month_hashes.keys() - hashes.keys() - changed.keys():
+            changed[month] = {} # deleted
+        self.stat = stat
+        self.last_hash = new_hash
+        self.month_hashes = hashes
+        return changed
+
+    def merge_external(self, data, changed):
+        """
+        replace the changed months in data with the file's, then apply the
+        changes made here since the last save on top of them again. Call
+        with the data locked; returns {day: (old times, new times)}.
+        """
+        old = {day: dict(data[day]) for day in data if month_of(day) in changed}
+        for day in old:
+            del data[day]
+        for days in changed.values():
+            for day, times in days.items():
+                data[day] = times
+        for op, day, task, value in self.pending:
+            if month_of(day) in changed:
+                apply_change(data, op, day, task, value)
+        merged = {}
+        for day in old.keys() | {day for days in changed.values() for day in days}:
+            new = dict(data[day]) if day in data else {}
+            if new != old.get(day, {}):
+                merged[day] = old.get(day, {}), new
+        return merged
+
+    def load_all(self, data, lock=nullcontext()):
+        """make sure data holds the complete history; lock is held while data is changed"""
+        pass
+
+    def snapshot(self, data):
+        if self.stat is not None:
+            self.pending = []
+        return copy_timedata(data)
+
+    def write(self, snapshot):
+        text = json.dumps(snapshot, indent=2)
+        if (new_hash := text_hash(text)) == self.last_hash:
+            return # nothing changed
+        backup()
+        write_atomic(self.fn, text)
+        self.last_hash = new_hash
+        if self.stat is not None:
+            self.stat = file_stat(self.fn)
+            self.month_hashes = {month: hash(days) for month, days in month_chunks(text).items()}
+
+    def save(self, data):
+        self.write(self.snapshot(data))
+
+    def import_all(self, data):
+        """replace everything in the store with data"""
+        self.write(copy_timedata(data))
+
+    def task_days(self, data, task, since=None):
+        """({date: minutes}, [reset dates]) for one task, only after the date since if given"""
+        return as_timedata(data).task_days(task, since)
+
+    def month_days(self, data):
+        """{datetime: {project: minutes}} for all days"""
+        return as_timedata(data).month_days()
+
+class JournalStore(JsonStore):
+    """
+    Every change is appended to the journal as a small line and fsynced, so
+    a write costs the same no matter how much history there is and a crash
+    loses at most the last tick. The journal starts with the hash of the
+    snapshot it applies to; a journal whose snapshot has been replaced
+    (eg a crash in the middle of compacting) has already been folded in and is ignored.
+    """
+    def __init__(self, fn=TIMECLOCK_FILE, journal=JOURNAL_FILE, compact_every=JOURNAL_COMPACT):
+        super().__init__(fn)
+        self.journal = journal
+        self.compact_every = compact_every
+        self.records = 0
+        self.torn = None # the complete lines, if replay found the last one cut short by a crash
+        self.f = None
+        self.jlock = Lock()
+
+    def read(self):
+        """the snapshot plus the journal, without opening the journal for writing"""
+        data = super().load()
+        self.records = self.replay(data, self.last_hash)
+        if self.records:
+            log.info("replayed %d journal entries from %s", self.records, self.journal)
+        return data
+
+    def load(self):
+        data = self.read()
+        if self.torn is not None: # cut the torn line off, or the next record() is written onto the end of it
+            log.warning("dropped a half written entry at the end of %s", self.journal)
+            self.open_journal(self.last_hash, tail=self.torn)
+            self.torn = None
+        else:
+            self.open_journal(self.last_hash, truncate=not self.records)
+        return data
+
+    def watch(self, stat, text):
+        pass # the journal only knows this computer; to share between computers use the nodes store
+
+    def replay(self, data, base):
+        self.torn = None
+        try:
+            with open(self.journal, encoding='utf-8', newline='') as f:
+                header = f.readline()
+                if header.strip() != f"#base {base}":
+                    return 0 # stale journal, already part of the snapshot
+                lines = []
+                for line in f:
+                    if not line.endswith("\n"):
+                        self.torn = lines # torn write from a crash
+                        break
+                    day, op, value, task = line.rstrip("\n").split("\t", 3)
+                    apply_change(data, op, day, task, int(value))
+                    lines.append(line)
+        except FileNotFoundError:
+            return 0
+        return len(lines)
+
+    def open_journal(self, base, truncate=True, tail=()):
+        """start the journal over on top of the snapshot with hash base, keeping the entries in tail"""
+        if self.f:
+            self.f.close()
+        if truncate:
+            write_atomic(self.journal, f"#base {base}\n" + "".join(tail), encoding='utf-8', newline='')
+            self.records = len(tail)
+        self.f = open(self.journal, 'a', encoding='utf-8', newline='')
+
+    def record(self, op, day, task, value=1):
+        self.record_many(((op, day, task, value),))
+
+    def record_many(self, changes):
+        """one append and one fsync for the lot"""
+        with self.jlock:
+            self.f.write("".join(f"{day}\t{op}\t{value}\t{task}\n" for op, day, task, value in changes))
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.records += len(changes)
+        count("journal_fsyncs")
+        count("journal_records", len(changes))
+
+    def snapshot(self, data):
+        """nothing to write until the journal is due for compacting"""
+        if self.records >= self.compact_every:
+            return copy_timedata(data), self.records
+
+    def write(self, snapshot):
+        if snapshot is None:
+            return
+        data, upto = snapshot
+        super().write(data)
+        with self.jlock:
+            # entries recorded while the snapshot was being written are not in it
+            with open(self.journal, encoding='utf-8', newline='') as f:
+                tail = f.readlines()[1+upto:]
+            self.open_journal(self.last_hash, tail=tail)
+        count("journal_compactions")
+        log.info("journal compacted into %s", self.fn)
+
+    def import_all(self, data):
+        """replace everything with data: a new snapshot and an empty journal on top of it"""
+        JsonStore.write(self, copy_timedata(data))
+        with self.jlock:
+            self.open_journal(self.last_hash)
+
+def month_of(day):
+    return day[:7] # "2024-05-08" -> "2024-05"
+
+class ShardedStore(JsonStore):
+    def __init__(self, folder=DATA_FOLDER, legacy=TIMECLOCK_FILE):
+        self.folder = folder
+        self.manifest_file = folder / "manifest.json"
+        self.legacy = legacy
+        self.months = set() # all months on disk
+        self.loaded = set() # months in memory
+        self.dirty = set() # months changed since the last snapshot
+        self.hashes = {}
+        self.data = None
+
+    def shard(self, month):
+        return self.folder / f"{month}.json"
+
+    def load(self):
+        try:
+            self.months = set(json.loads(self.manifest_file.read_text())["months"])
+            log.info("loaded timedata manifest %s", self.manifest_file)
+        except FileNotFoundError:
+            self.data = self.migrate()
+            return self.data
+        self.data = TimeData()
+        self.page_in(time.strftime("%Y-%m"))
+        return self.data
+
+    def migrate(self):
+        """first run; split up the single file"""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        data = TimeData(load_timeclock(self.legacy))
+        self.loaded = {month_of(day) for day in data}
+        self.dirty = set(self.loaded)
+        self.save(data)
+        log.info("split %s into %d monthly files in %s", self.legacy, len(self.loaded), self.folder)
+        return data
+
+    def read_shard(self, month):
+        """(hash, days) of a month's file"""
+        text = self.shard(month).read_text()
+        return text_hash(text), json.loads(text)
+
+    def page_in(self, month, shard=None):
+        """add a month to the data; shard is what read_shard() gave, if it was read already"""
+        self.loaded.add(month)
+        if month not in self.months:
+            return
+        self.hashes[month], days = shard or self.read_shard(month)
+        for day, times in days.items():
+            mem = self.data.setdefault(day, {})
+            for key, value in times.items():
+                if key in mem and not isinstance(value, bool):
+                    mem[key] += value # changed before it was paged in
+                else:
+                    mem[key] = value
+        log.debug("paged in %s", month)
+
+    def load_all(self, data, lock=nullcontext()):
+        """the files are read and parsed with the lock released; only the merging holds it"""
+        for month in sorted(self.months - self.loaded):
+            shard = self.read_shard(month)
+            with lock:
+                if month not in self.loaded: # record() may have paged it in meanwhile
+                    self.page_in(month, shard)
+
+    def record(self, op, day, task, value=1):
+        month = month_of(day)
+        if month not in self.loaded:
+            self.page_in(month)
+        self.dirty.add(month)
+
+    def import_all(self, data):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.dirty = {month_of(day) for day in data}
+        self.write(self.snapshot(data))
+
+    def snapshot(self, data):
+        months = {month: {} for month in self.dirty}
+        for day, times in data.items():
+            if (month := month_of(day)) in months:
+                months[month][day] = dict(times)
+        self.dirty.clear()
+        return months
+
+    def write(self, snapshot):
+        if not snapshot:
+            return
+        for month, days in snapshot.items():
+            text = json.dumps(days, indent=2)
+            if (new_hash := text_hash(text)) != self.hashes.get(month):
+                write_atomic(self.shard(month), text)
+                self.hashes[month] = new_hash
+        if not self.months.issuperset(snapshot):
+            self.months.update(snapshot)
+            write_atomic(self.manifest_file, json.dumps(dict(months=sorted(self.months)), indent=2))
+
+class BinaryStore(JsonStore):
+    """
+    The report queries scan the memory mapped file instead of the timedata,
+    as long as the file holds every change made here.
+    """
+    def __init__(self, fn=BINARY_FILE, legacy=TIMECLOCK_FILE):
+        super().__init__(fn)
+        self.legacy = legacy
+        self.changes = 0 # counts record()s
+        self.snapshot_at = 0 # self.changes when the last snapshot was taken
+        self.file_at = None # self.changes that the file is up to date with
+
+    def load(self):
+        if not self.fn.exists():
+            log.info("binary file not found; converting %s", self.legacy)
+            return TimeData(load_timeclock(self.legacy))
+        import columnar
+        data = TimeData(columnar.load_columnar(self.fn))
+        self.last_hash = hashlib.sha1(self.fn.read_bytes()).hexdigest()
+        self.file_at = self.changes
+        log.info("loaded timedata file %s", self.fn)
+        return data
+
+    def record(self, op, day, task, value=1):
+        self.changes += 1
+
+    def snapshot(self, data):
+        self.snapshot_at = self.changes
+        return super().snapshot(data)
+
+    def write(self, snapshot):
+        import columnar
+        content = columnar.dumps(columnar.to_columns(snapshot))
+        if (new_hash := hashlib.sha1(content).hexdigest()) != self.last_hash:
+            write_atomic(self.fn, content)
+            self.last_hash = new_hash
+        self.file_at = self.snapshot_at
+
+    def columnar_file(self):
+        """the mmapped file, or None if there are changes it doesn't have yet"""
+        if self.file_at != self.changes:
+            return None
+        import columnar
+        return columnar.ColumnarFile(self.fn)
+
+    def task_days(self, data, task, since=None):
+        if (cf := self.columnar_file()) is None:
+            return super().task_days(data, task, since)
+        from datetime import date
+        with cf:
+            days, resets = cf.task_minutes(task, since.toordinal() if since else 0)
+        return ({date.fromordinal(ordinal): minutes for ordinal, minutes in days.items()},
+            [date.fromordinal(ordinal) for ordinal in resets])
+
+    def month_days(self, data):
+        if (cf := self.columnar_file()) is None:
+            return super().month_days(data)
+        import columnar
+        from datetime import datetime
+        with cf:
+            return {datetime.fromordinal(ordinal): times for ordinal, times in columnar.day_times(cf.columns())}
+
+class SqliteStore(JsonStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS minutes (
+            project TEXT NOT NULL,
+            day TEXT NOT NULL,
+            minutes INTEGER NOT NULL,
+            PRIMARY KEY (project, day)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS minutes_day ON minutes (day);
+        CREATE TABLE IF NOT EXISTS resets (
+            project TEXT NOT NULL,
+            day TEXT NOT NULL,
+            PRIMARY KEY (project, day)) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS days (
+            day TEXT PRIMARY KEY) WITHOUT ROWID; -- every day in the timedata, so the empty ones are kept too
+        """
+
+    def __init__(self, fn=SQLITE_FILE, legacy=TIMECLOCK_FILE):
+        super().__init__(fn)
+        self.legacy = legacy
+        self.db = None
+        self.dblock = Lock()
+
+    def connect(self):
+        import sqlite3
+        new = not self.fn.exists()
+        self.db = sqlite3.connect(self.fn, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        if new and self.legacy.exists():
+            log.info("new database; importing %s", self.legacy)
+            self.import_all(load_timeclock(self.legacy))
+
+    def load(self):
+        if self.db is None:
+            self.connect()
+        data = TimeData()
+        with self.dblock:
+            for project, day, minutes in self.db.execute("SELECT project, day, minutes FROM minutes ORDER BY day"):
+                data.add(day, project, minutes)
+            for project, day in self.db.execute("SELECT project, day FROM resets"):
+                data.bill(day, project)
+            for day, in self.db.execute("SELECT day FROM days"):
+                data.record(day)
+        log.info("loaded timedata database %s", self.fn)
+        return data
+
+    def record(self, op, day, task, value=1):
+        self.record_many(((op, day, task, value),))
+
+    def record_many(self, changes):
+        """all in one transaction"""
+        with self.dblock, self.db:
+            for op, day, task, value in changes:
+                if op == "add":
+                    self.db.execute(
+                        "INSERT INTO minutes VALUES (?, ?, ?) "
+                        "ON CONFLICT (project, day) DO UPDATE SET minutes = minutes + excluded.minutes",
+                        (task, day, value))
+                elif op == "bill":
+                    self.db.execute("INSERT OR IGNORE INTO resets VALUES (?, ?)", (task, day))
+
+    def snapshot(self, data):
+        return None # every change is committed as it's recorded
+
+    def write(self, snapshot):
+        pass
+
+    def import_all(self, data):
+        if self.db is None:
+            self.connect()
+        minutes = []
+        resets = []
+        days = [(day,) for day in data]
+        for day, times in data.items():
+            for key, value in times.items():
+                if value is True and key.endswith(RESET.format("")):
+                    resets.append((key[:-len(RESET.format(""))], day))
+                else:
+                    minutes.append((key, day, value))
+        with self.dblock, self.db:
+            self.db.execute("DELETE FROM minutes")
+            self.db.execute("DELETE FROM resets")
+            self.db.execute("DELETE FROM days")
+            self.db.executemany("INSERT INTO minutes VALUES (?, ?, ?)", minutes)
+            self.db.executemany("INSERT INTO resets VALUES (?, ?)", resets)
+            self.db.executemany("INSERT INTO days VALUES (?)", days)
+
+    def task_days(self, data, task, since=None):
+        from datetime import datetime
+        after = since.strftime(DAY_FMT) if since else ""
+        with self.dblock:
+            days = {datetime.strptime(day, DAY_FMT).date(): minutes for day, minutes in
+                self.db.execute("SELECT day, minutes FROM minutes WHERE project = ? AND day > ? AND minutes", (task, after))}
+            resets = [datetime.strptime(day, DAY_FMT).date() for day, in
+                self.db.execute("SELECT day FROM resets WHERE project = ? AND day > ? ORDER BY day", (task, after))]
+        return days, resets
+
+    def month_days(self, data, start="", end="9999"):
+        from datetime import datetime
+        days = {}
+        with self.dblock:
+            rows = self.db.execute(
+                "SELECT day, project, minutes FROM minutes WHERE day BETWEEN ? AND ? "
+                "UNION ALL SELECT day, project || ?, 1 FROM resets WHERE day BETWEEN ? AND ?",
+                (start, end, RESET.format(""), start, end))
+            for day, project, minutes in rows:
+                days.setdefault(day, {})[project] = minutes
+            for day, in self.db.execute("SELECT day FROM days WHERE day BETWEEN ? AND ?", (start, end)):
+                days.setdefault(day, {}) # still gets its month a heading in the report
+        return {datetime.strptime(day, DAY_FMT): times for day, times in days.items()}
+
+def node_name():
+    """this computer, as used in file names"""
+    return re.sub(r"[^\w.-]", "_", platform.node()) or "unknown"
+
+def merge_timedata(*datas):
+    """
+    combine several timedata dicts: minutes are summed per day and project,
+    billing flags are or'ed. The result does not depend on the order of the inputs.
+    """
+    merged = {}
+    for data in datas:
+        for day, times in data.items():
+            mtimes = merged.setdefault(day, {})
+            for key, value in times.items():
+                if value is True:
+                    mtimes[key] = True
+                else:
+                    mtimes[key] = mtimes.get(key, 0) + value
+    return {day: dict(sorted(merged[day].items())) for day in sorted(merged)}
+
+class NodeStore(JsonStore):
+    LEGACY = "_legacy" # the single file data from before, as a read only node
+
+    def __init__(self, folder=NODES_FOLDER, node=None, legacy=TIMECLOCK_FILE):
+        self.folder = folder
+        self.node = node or node_name()
+        self.legacy = legacy
+        self.own_store = self.node_store(self.node)
+        self.own = {} # only the changes made on this computer
+
+    def node_store(self, node):
+        return JournalStore(self.folder / f"{node}.json", self.folder / f"{node}.journal")
+
+    def nodes(self):
+        return sorted({f.stem for f in self.folder.glob("*.json")} | {f.stem for f in self.folder.glob("*.journal")})
+
+    def load(self):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        legacy_node = self.folder / f"{self.LEGACY}.json"
+        if self.legacy.exists() and not legacy_node.exists():
+            write_atomic(legacy_node, self.legacy.read_text())
+            log.info("imported %s as %s", self.legacy, legacy_node)
+        self.own = self.own_store.load()
+        others = [self.node_store(node).read() for node in self.nodes() if node != self.node]
+        log.info("merged data from %d computers", len(others)+1)
+        return TimeData(merge_timedata(self.own, *others))
+
+    def record(self, op, day, task, value=1):
+        self.record_many(((op, day, task, value),))
+
+    def record_many(self, changes):
+        for change in changes:
+            apply_change(self.own, *change)
+        self.own_store.record_many(changes)
+
+    def snapshot(self, data):
+        return self.own_store.snapshot(self.own)
+
+    def write(self, snapshot):
+        self.own_store.write(snapshot)
+
+    def import_all(self, data):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.folder / f"{self.LEGACY}.json", json.dumps(copy_timedata(data), indent=2))
+
+STORES = dict(
+    json=JsonStore,
+    journal=JournalStore,
+    sharded=ShardedStore,
+    binary=BinaryStore,
+    sqlite=SqliteStore,
+    nodes=NodeStore,
+    )
+
+def open_store(kind=STORAGE):
+    return STORES[kind]()
+
+def migrate(src_kind, dst_kind):
+    src = open_store(src_kind)
+    data = src.load()
+    src.load_all(data)
+    open_store(dst_kind).import_all(data)
+    print(f"copied {len(data)} days from {src_kind} to {dst_kind} storage")
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="timekeeper storage")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    mig = sub.add_parser("migrate", help="copy all data from one storage to another")
+    mig.add_argument("--from", dest="src", default="json", choices=STORES)
+    mig.add_argument("--to", dest="dst", default=STORAGE, choices=STORES)
+    args = parser.parse_args()
+    if args.cmd == "migrate":
+        migrate(args.src, args.dst)
+
+if __name__ == "__main__":
+    main()
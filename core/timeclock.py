@@ -1,208 +1,387 @@
 #!/usr/bin/env python3.9
 
 import time
-import json
-from pathlib import Path
-from threading import Thread
-from datetime import datetime
-from collections import defaultdict
-import platform
-from functools import cache
+from threading import Lock, RLock
 from bisect import bisect
 
-from constants import TIMECLOCK_FILE, DAY_FMT, BACKUP_FOLDER, BACKUPS
-from constants import OFF, REPORT_FRACTION, AUTOSAVE, RESET
-
-@cache
-def backup():
-    if TIMECLOCK_FILE.exists():
-        if BACKUPS:
-            if not BACKUP_FOLDER.exists():
-                BACKUP_FOLDER.mkdir()
-            bkup_prefix = f"{time.strftime('%Y-%m-%d-%H-%M-%S')}_{platform.node()}_{platform.system()}"
-            with open(BACKUP_FOLDER / f"{bkup_prefix}_{TIMECLOCK_FILE.name}", 'w') as f:
-                f.write(TIMECLOCK_FILE.read_text())
-            print("timeclock backed up")
-
-def load_timeclock(fn=TIMECLOCK_FILE):
-    try:
-        with open(fn) as f:
-            data = json.load(f)
-        print('Loaded timedata file:', TIMECLOCK_FILE)
-    except FileNotFoundError:
-        print("times file not found; creating new one")
-        data = {}
-    return data
-
-def save_timeclock(data, fn=TIMECLOCK_FILE):
-    backup()
-    with open(fn, 'w') as f:
-        json.dump(data, f, indent=2)
+from constants import DAY_FMT, OFF, REPORT_FRACTION, AUTOSAVE, WATCH_INTERVAL, RESET, METRICS, METRICS_INTERVAL
+from scheduler import Scheduler
+from storage import open_store
+from billing import section_lines, min_to_human, min_to_fraction
+from columnar import split_key
+import metrics
+import logs
+
+log = logs.get_logger("timeclock")
 
 class Timeclock:
-    def __init__(self, callback=None):
+    def __init__(self, callback=None, store=None, scheduler=None):
         self.dirty = False
-        self.callback = callback
-        self.timedata = load_timeclock()
+        self.callback = callback # gets the new status text whenever it changes
+        self.store = store or open_store()
+        with metrics.measure("load"):
+            self.timedata = self.store.load()
+        self.aggregates = None
+        self.frozen = {} # task name: FrozenSections
+        self.index = None
+        self.version = 0 # goes up with every change to the timedata
+        self.queries = {} # query args: rows, for self.queries_version
+        self.queries_version = 0
         self.clocked_in = OFF
-        timer = Thread(target=self.minute_clock, daemon=True)
-        timer.start()
-        autosaver = Thread(target=self.autosave_clock, daemon=True)
-        autosaver.start()
-
-    def minute_clock(self):
-        while True:
-            self.tick()
-            time.sleep(60)
-
-    def autosave_clock(self):
-        while True:
-            print(time.strftime("%Y-%m-%d_%H:%M"), "Am i dirty?", self.dirty)
-            if self.dirty:
-                self.save()
-                self.dirty = False
-            time.sleep(60*AUTOSAVE)
+        self.started = None # start of the part of the current interval not logged yet
+        self.seconds = {} # (day, task): seconds worked but not logged yet, always < 60
+        self.lock = RLock() # guards timedata
+        self.write_lock = Lock() # one write to disk at a time
+        self.save_pending = False
+        self.status = None # the last status text sent to the callback
+        self.status_job = None
+        self.scheduler = scheduler or Scheduler()
+        self.scheduler.every(60*AUTOSAVE, self.autosave)
+        if WATCH_INTERVAL:
+            self.scheduler.every(WATCH_INTERVAL, self.refresh, first=WATCH_INTERVAL)
+        if METRICS:
+            self.scheduler.every(METRICS_INTERVAL, metrics.write_file, first=METRICS_INTERVAL)
+
+    def autosave(self):
+        self.log_time()
+        log.debug("autosave, dirty=%s", self.dirty)
+        if self.dirty:
+            self.save()
+            self.dirty = False
+        logs.flush()
 
     def save(self):
-        save_timeclock(self.timedata)
-
-    def monthreport(self):
-        days = {datetime.strptime(key, DAY_FMT): value for key, value in self.timedata.items()}
-        months = defaultdict(list)
-        for day, times in days.items():
-            months[datetime(day.year, day.month, 1)].append((day, times))
-
-        result = []
-        for month in sorted(months, reverse=True):
-            result.append(month.strftime("%B %Y"))
-
-            month_totals = defaultdict(int)
-            day_totals = defaultdict(dict)
-            all_times = months[month]
-            for day, times in all_times:
-                for project, minutes in times.items():
-                    month_totals[project] += minutes
-                    day_totals[project][day] = minutes
-
-            for project in sorted(month_totals):
-                result.append(f"{project} total: {convert_func(month_totals[project])}")
-                result.append(month_percent(month_totals[project], month))
-                dates = day_totals[project]
+        """
+        request a save; returns immediately. The write happens on the scheduler
+        thread and any number of requests while one is waiting make one write.
+        """
+        with self.lock:
+            if not self.save_pending:
+                self.save_pending = True
+                self.scheduler.call_soon(self.write)
+
+    def write(self):
+        self.save_pending = False
+        self.flush()
+
+    @metrics.timed("save")
+    def flush(self):
+        """save now, in this thread"""
+        with self.write_lock:
+            self.merge_external() # never write over what another computer saved
+            with self.lock:
+                self.log_time()
+                snapshot = self.store.snapshot(self.timedata)
+            self.store.write(snapshot)
+
+    def refresh(self):
+        """pick up the changes another computer made to the data file"""
+        with self.write_lock:
+            self.merge_external()
+
+    def merge_external(self):
+        try:
+            changed = self.store.external_changes()
+        except (OSError, ValueError):
+            log.exception("could not read the data file changed by another computer")
+            return
+        if not changed:
+            return
+        with self.lock:
+            days = self.store.merge_external(self.timedata, changed)
+            for day, (old, new) in days.items():
+                if self.aggregates is not None:
+                    self.aggregates.replace_day(day, old, new)
+                for key in old.keys() | new.keys():
+                    project, is_reset = split_key(key, old.get(key, new.get(key)))
+                    if self.index is not None and not is_reset and (delta := new.get(key, 0) - old.get(key, 0)):
+                        self.index.add(day, project, delta)
+                    self.frozen.pop(project, None)
+            self.version += 1
+        metrics.count("external_days", len(days))
+        log.info("merged %d days changed on another computer", len(days))
+        self.tick()
+
+    def load_history(self):
+        """page in any history the store did not load at startup; the lock is only held to merge it in"""
+        with self.lock:
+            self.log_time()
+        self.store.load_all(self.timedata, self.lock)
+
+    def month_aggregates(self):
+        """
+        the month totals; built from the full history on first use, from a
+        copy taken with the lock held but with ticks and clicks going on
+        """
+        if self.aggregates is None:
+            from aggregates import MonthAggregates
+            self.load_history()
+            with self.lock:
+                version = self.version
+                month_days = self.store.month_days(self.timedata)
+            aggregates = MonthAggregates(month_days)
+            with self.lock:
+                if self.aggregates is None:
+                    if self.version != version: # changed while building; rare enough to just do it again
+                        aggregates = MonthAggregates(self.store.month_days(self.timedata))
+                    self.aggregates = aggregates
+        return self.aggregates
+
+    def time_index(self):
+        """TimeIndex for date range totals; built from the full history on first use"""
+        if self.index is None:
+            from timeindex import TimeIndex
+            self.load_history()
+            with self.lock:
+                self.index = TimeIndex(self.timedata)
+        return self.index
+
+    def query(self, start=None, end=None, tasks=None, group_by="task"):
+        """
+        minutes per task and period as QueryRows; see query.py. The results are
+        kept until the timedata changes, so asking again between ticks is free.
+        """
+        from query import run_query
+        index = self.time_index()
+        key = start, end, tasks if tasks is None else tuple(tasks), group_by
+        with self.lock:
+            self.log_time()
+            if self.queries_version != self.version:
+                self.queries = {}
+                self.queries_version = self.version
+            if (rows := self.queries.get(key)) is None:
+                metrics.count("query_cache_misses")
+                rows = self.queries[key] = run_query(index, start, end, key[2], group_by)
+        return rows
+
+    @metrics.timed("monthreport")
+    def monthreport(self, months=None):
+        """months: only show the this many most recent months"""
+        return '\n'.join(self.monthreport_rows(months))
+
+    def monthreport_rows(self, months=None, month=None, task=None):
+        """
+        the lines of the month report, formatted as they are asked for.
+        month ("YYYY-MM") and task only show that month or task.
+        """
+        from datetime import datetime
+        agg = self.month_aggregates()
+        with self.lock:
+            # a copy of only what is shown, so all the rows are from the same moment
+            # and the formatting happens with the lock released
+            snapshot = [(month_name, {project: (total, dict(agg.days[month_name][project]))
+                    for project, total in agg.totals[month_name].items()
+                    if not task or project in (task, RESET.format(task))})
+                for month_name in agg.recent(months) if not month or month_name == month]
+        for month_name, projects in snapshot:
+            monthdate = datetime.strptime(month_name, "%Y-%m")
+            yield monthdate.strftime("%B %Y")
+            for project in sorted(projects):
+                total, dates = projects[project]
+                yield f"{project} total: {convert_func(total)}"
+                yield month_percent(total, monthdate)
                 for day in sorted(dates):
-                    result.append(f"{day.strftime(DAY_FMT)}\t{convert_func(dates[day])}")
-
-            result.append("")
-        return '\n'.join(result)
-
+                    yield f"{day}\t{convert_func(dates[day])}"
+            yield ""
+
+    def report_months(self):
+        """the months in the month report, newest first"""
+        agg = self.month_aggregates()
+        with self.lock:
+            return agg.recent()
+
+    def report_tasks(self):
+        agg = self.month_aggregates()
+        with self.lock:
+            return sorted({project for totals in agg.totals.values() for project in totals
+                if not project.endswith(RESET.format(""))})
+
+    def frozen_sections(self, task):
+        """the billed part of a task's report, cached until something before the last billpoint changes"""
+        if (frozen := self.frozen.get(task)) is None:
+            metrics.count("taskreport_cache_misses")
+            days, resets = self.store.task_days(self.timedata, task)
+            frozen = self.frozen[task] = FrozenSections(days, resets)
+        return frozen
+
+    @metrics.timed("taskreport")
     def taskreport(self, task):
-        days = {}
-        resets = []
-        for key, value in self.timedata.items():
-            key = datetime.strptime(key, DAY_FMT).date()
-            if (minutes := value.get(task)):
-                days[key] = minutes
-            if (val := value.get(RESET.format(task))):
-                resets.append(key)
-        daylist = list(sorted(days))
-        resets.sort()
-        splitpoints = [bisect(daylist, billdate) for billdate in resets]
-        sections = []
-        for start, end in zip([None]+splitpoints, splitpoints+[None]):
-            sections.append(daylist[start:end])
+        return '\n'.join(self.taskreport_rows(task))
+
+    def taskreport_rows(self, task):
+        """the lines of the task report; the billed sections come from the cache"""
+        self.load_history()
+        with self.lock:
+            frozen = self.frozen_sections(task)
+            days, resets = self.store.task_days(self.timedata, task, since=frozen.last)
+            if resets: # billed since the cache was made
+                del self.frozen[task]
+                yield from self.taskreport_rows(task)
+                return
+        yield f"Times for {task}:"
+        yield "(line) (Date) (day actual min) (day time rounded) (section sum) (carry min)"
+        yield ""
         carry = 0
-        output = f"Times for {task}:\n(line) (Date) (day actual min) (day time rounded) (section sum) (carry min)\n\n"
-        resets.append("TBD")
-
-        for idx, section in enumerate(reversed(sections)):
-            if not section:
-                continue
-
-            sec_out = [f"=== Billed {resets[~idx]} ==="]
-            sec_sum = 0
-            for linenum, day in enumerate(section,1):
-                minutes_worked = days[day] + carry
-                hours, minutes = divmod(minutes_worked, 60)
-                quarterhours, carry = divmod(minutes, 15)
-                sec_sum += (hours*60 + quarterhours*15)
-                # ~ print(day, minutes_worked, hours, quarterhours, carry, sec_sum)
-                sec_out.append(
-                    f"{linenum:<3}\t"
-                    f"{day.strftime(DAY_FMT)}\t{days[day]:<4}\t"
-                    f"{hours:0>2}.{quarterhours*25:0>2}\t"
-                    f"{min_to_human(sec_sum):<8}\t{carry}")
-            output += "\n".join(sec_out)
-            output += "\n\n"
-
-        return output
-
-    def clock_billpoint(self, job_name, event=None):
-        today = time.strftime(DAY_FMT)
-        if today not in self.timedata:
-            self.timedata[today] = {}
-        self.timedata[today][RESET.format(job_name)] = True
-        self.dirty = True
-
-    def tick(self):
-        """adds 1 to the current clocked in job"""
-        if self.clocked_in == OFF:
+        if days:
+            sec_out, carry = section_lines("TBD", sorted(days), days, carry)
+            yield from sec_out.split("\n")[:-1]
+        yield from frozen.render(carry).split("\n")
+
+    def add_minutes(self, day, job_name, minutes):
+        """the one place minutes get logged"""
+        self.apply_changes((("add", day, job_name, minutes),))
+
+    def set_billpoint(self, day, job_name):
+        self.apply_changes((("bill", day, job_name, 1),))
+
+    def apply_changes(self, changes):
+        """
+        ("add", day, task, minutes) and ("bill", day, task, 1) changes, made
+        together and handed to the store in one write
+        """
+        if not changes:
             return
+        with self.lock:
+            for op, day, job_name, value in changes:
+                if op == "add":
+                    self.timedata.add(day, job_name, value)
+                    if self.aggregates is not None:
+                        self.aggregates.add(day, job_name, value)
+                    if self.index is not None:
+                        self.index.add(day, job_name, value)
+                    if (frozen := self.frozen.get(job_name)) and frozen.last_day and day <= frozen.last_day:
+                        del self.frozen[job_name] # changed an already billed day
+                elif op == "bill":
+                    if self.timedata.bill(day, job_name) and self.aggregates is not None:
+                        self.aggregates.add(day, RESET.format(job_name), True) # the month report lists these too
+                    self.frozen.pop(job_name, None)
+            self.store.record_many(changes)
+            self.version += 1
         self.dirty = True
 
-        today = time.strftime(DAY_FMT)
-        if today not in self.timedata:
-            self.timedata[today] = {}
-        if self.clocked_in not in self.timedata[today]:
-            self.timedata[today][self.clocked_in] = 0
-        self.timedata[today][self.clocked_in] += 1
-
-        if self.callback:
-            self.callback(self.report())
+    def clock_billpoint(self, job_name, event=None):
+        self.set_billpoint(time.strftime(DAY_FMT), job_name)
+
+    def log_time(self, now=None):
+        """log the current interval up to now into the timedata, split up by day"""
+        now = now or time.time()
+        with self.lock:
+            if self.clocked_in == OFF:
+                return
+            for day, seconds in split_days(self.started, now):
+                key = day, self.clocked_in
+                minutes, self.seconds[key] = divmod(self.seconds.get(key, 0) + seconds, 60)
+                if minutes:
+                    self.add_minutes(day, self.clocked_in, int(minutes))
+            self.started = now
+
+    @metrics.timed("tick")
+    def tick(self):
+        """
+        log the time worked so far and push the status to the callback if it
+        changed. While clocked in this reschedules itself for the moment the
+        status text will change next: the next whole minute or midnight.
+        """
+        with self.lock:
+            if self.status_job:
+                self.status_job.cancel()
+                self.status_job = None
+            text = self.report()
+            if self.clocked_in != OFF:
+                now = time.time()
+                today = time.strftime(DAY_FMT, time.localtime(now))
+                wait = 60 - self.seconds.get((today, self.clocked_in), 0)
+                self.status_job = self.scheduler.call_at(min(now + wait, next_midnight(now)) + 0.01, self.tick)
+        if self.callback and text != self.status:
+            self.status = text
+            self.callback(text)
 
     def report(self):
         today = time.strftime(DAY_FMT)
+        self.log_time()
         if self.clocked_in == OFF:
             return "Clocked out"
-        elif today in self.timedata and self.clocked_in in self.timedata[today]:
-            return f"{today}: {self.clocked_in} for {min_to_human(self.timedata[today][self.clocked_in])}"
+        elif (minutes := self.timedata.minutes(today, self.clocked_in)):
+            return f"{today}: {self.clocked_in} for {min_to_human(minutes)}"
         else:
             return f"{today}: {self.clocked_in} for 0 minutes"
 
     def clock_in(self, job_name):
-        self.clocked_in = job_name
+        """close the running interval, if any, and start a new one"""
+        now = time.time()
+        with self.lock:
+            self.log_time(now)
+            self.seconds = {key: seconds for key, seconds in self.seconds.items() if key[0] == time.strftime(DAY_FMT)}
+            self.clocked_in = job_name
+            self.started = now
+        self.tick()
 
         if job_name == OFF:
-            print("clocked out")
+            log.info("clocked out")
         else:
-            print("clocked in for", job_name)
+            log.info("clocked in for %s", job_name)
 
     def clock_out(self):
-        self.clocked_in = OFF
+        self.clock_in(OFF)
 
     def __del__(self):
-        self.save()
-
-def min_to_human(minutes):
-    hours, minutes = divmod(minutes, 60)
-    return f"{hours}h, {minutes}m"
-
-def min_to_fraction(minutes):
-    hours, minutes = divmod(minutes, 60)
-    minutes = round(minutes / 15) * 25
-    if minutes == 100:
-        minutes = 0
-        hours += 1
-    return f"{hours}.{minutes}"
+        self.flush()
+
+def next_midnight(timestamp):
+    t = time.localtime(timestamp)
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+
+def split_days(start, end):
+    """(day, seconds) for every day the interval between the two timestamps touches"""
+    while start < end:
+        stop = min(end, next_midnight(start))
+        yield time.strftime(DAY_FMT, time.localtime(start)), stop - start
+        start = stop
+
+class FrozenSections:
+    """
+    The sections of a task report up to the last billpoint. Those days never
+    change, but the report runs newest first and carries leftover minutes
+    into the older sections, so the text depends on the carry coming out of
+    the open section. There are only 15 possible carries; each is rendered once.
+    Always billed with billing.DEFAULT_RULE; see billing.py for the others.
+    """
+    def __init__(self, days, resets):
+        self.resets = sorted(resets)
+        self.last = self.resets[-1] if self.resets else None
+        self.last_day = self.last.strftime(DAY_FMT) if self.last else None
+        self.days = {day: minutes for day, minutes in days.items() if self.last and day <= self.last}
+        daylist = sorted(self.days)
+        splitpoints = [bisect(daylist, billdate) for billdate in self.resets]
+        self.sections = [daylist[start:end] for start, end in zip([None]+splitpoints, splitpoints)]
+        self.rendered = {}
+
+    def render(self, carry_in):
+        if carry_in not in self.rendered:
+            output = ""
+            carry = carry_in
+            for billdate, section in reversed(list(zip(self.resets, self.sections))):
+                if section:
+                    sec_out, carry = section_lines(billdate, section, self.days, carry)
+                    output += sec_out
+            self.rendered[carry_in] = output
+        return self.rendered[carry_in]
+
 convert_func = min_to_fraction if REPORT_FRACTION else min_to_human
 
 MONTHDAYS = [None, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
-def month_percent(minutes, month, cap=32*60):
+MONTH_CAP = 32*60
+def month_elapsed(month):
+    from datetime import datetime
     today = datetime.today()
     if month.month == today.month and month.year == today.year:
-        month_elapsed = today.day / MONTHDAYS[today.month]
+        return today.day / MONTHDAYS[today.month]
     else:
-        month_elapsed = 1.0
+        return 1.0
+
+def month_percent(minutes, month, cap=MONTH_CAP):
     billable_elapsed = minutes / cap
-    return f"{billable_elapsed:.0%} hours at {month_elapsed:.0%} month"
+    return f"{billable_elapsed:.0%} hours at {month_elapsed(month):.0%} month"
 
 def main():
     t = Timeclock()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+from bisect import bisect_left, bisect_right
+
+from model import TASKS, as_timedata, day_ordinal
+
+def to_ordinal(day):
+    """a date, datetime or DAY_FMT string as a date ordinal"""
+    if isinstance(day, str):
+        return day_ordinal(day)
+    return day.toordinal()
+
+class TimeIndex:
+    """
+    Per project, the sorted day ordinals worked and the running total of
+    minutes through each of them. The minutes between any two dates are the
+    difference of two running totals found with bisect, so a lookup costs
+    the same no matter how much history there is.
+    """
+    def __init__(self, timedata=None):
+        self.ordinals = {} # project: [day ordinal, ...]
+        self.cumulative = {} # project: [minutes through that day, ...]
+        per_project = {}
+        for ordinal, task_id, minutes in as_timedata(timedata or {}).entries():
+            if minutes is not None: # not a billpoint
+                per_project.setdefault(TASKS.names[task_id], []).append((ordinal, minutes))
+        for project, days in per_project.items():
+            days.sort()
+            total = 0
+            cumulative = []
+            for ordinal, minutes in days:
+                total += minutes
+                cumulative.append(total)
+            self.ordinals[project] = [ordinal for ordinal, minutes in days]
+            self.cumulative[project] = cumulative
+
+    def add(self, day, project, minutes):
+        """log more minutes; O(1) for the latest day, which is the usual case"""
+        ordinal = to_ordinal(day)
+        ordinals = self.ordinals.setdefault(project, [])
+        cumulative = self.cumulative.setdefault(project, [])
+        i = bisect_left(ordinals, ordinal)
+        if i == len(ordinals) or ordinals[i] != ordinal:
+            ordinals.insert(i, ordinal)
+            cumulative.insert(i, cumulative[i-1] if i else 0)
+        for j in range(i, len(cumulative)):
+            cumulative[j] += minutes
+
+    def range_total(self, task, start, end):
+        """minutes on task from start to end, both dates included"""
+        ordinals = self.ordinals.get(task)
+        if not ordinals:
+            return 0
+        cumulative = self.cumulative[task]
+        lo = bisect_left(ordinals, to_ordinal(start))
+        hi = bisect_right(ordinals, to_ordinal(end))
+        if hi <= lo:
+            return 0
+        return cumulative[hi-1] - (cumulative[lo-1] if lo else 0)
+
+    def day_totals(self, task, start=None, end=None):
+        """(day ordinal, minutes) for each day worked on task from start to end, both included"""
+        ordinals = self.ordinals.get(task, [])
+        cumulative = self.cumulative.get(task, [])
+        lo = bisect_left(ordinals, to_ordinal(start)) if start else 0
+        hi = bisect_right(ordinals, to_ordinal(end)) if end else len(ordinals)
+        previous = cumulative[lo-1] if lo else 0
+        for i in range(lo, hi):
+            yield ordinals[i], cumulative[i] - previous
+            previous = cumulative[i]
+
+    def range_totals(self, start, end):
+        """{task: minutes} from start to end for all tasks that have any"""
+        totals = {}
+        for task in self.ordinals:
+            if (minutes := self.range_total(task, start, end)):
+                totals[task] = minutes
+        return totals
@@ -1,21 +1,35 @@
 #!/usr/bin/env python3
 
+import time
+STARTUP = PHASE = time.perf_counter()
+
 import json
 from pathlib import Path
 import platform
 import getpass
 import os
-import time
 from functools import partial
+from threading import Thread
 
 import moduleinstaller
 moduleinstaller.gui_check_and_prompt({"wx":"wxpython"})
 import wx
 
-from timekeeper_wxg import ShowTimes, TimeKeeperFrame, AlreadyRunningFrameCore
-from timeclock import Timeclock
+from timekeeper_wxg import TimeKeeperFrame, AlreadyRunningFrameCore
+from client import daemon_running, RemoteTimeclock, DaemonError
+import metrics
+import logs
+
+from constants import SETTING_FILE, LOGO_FILE, SENTINEL_FILE, STAY_ON_TOP, SETTING_DEFAULT, OFF
+
+log = logs.get_logger("gui")
 
-from constants import SETTING_FILE, LOGO_FILE, SENTINEL_FILE, STAY_ON_TOP, SETTING_DEFAULT
+def startup_phase(name):
+    """print how long this phase of starting up took"""
+    global PHASE
+    now = time.perf_counter()
+    log.info("startup: %s %.0f ms (total %.0f ms)", name, (now-PHASE)*1000, (now-STARTUP)*1000)
+    PHASE = now
 
 def id_yourself():
     return f"User {getpass.getuser()!r} on {platform.node()} ({platform.system()}) @ {time.strftime('%Y-%m-%d_%H:%M')}"
@@ -24,11 +38,11 @@ def load_settings():
     try:
         with open(SETTING_FILE) as f:
             settings = json.load(f)
-        print("Loaded", SETTING_FILE)
+        log.info("loaded %s", SETTING_FILE)
     except FileNotFoundError:
         settings = SETTING_DEFAULT
     except Exception as e:
-        print("unexpected load error:", e)
+        log.error("unexpected error loading %s: %s", SETTING_FILE, e)
         settings = SETTING_DEFAULT
     return settings
 
@@ -51,7 +65,7 @@ def set_position(frame, old_position):
 
     if (oldx-BUFFER < screen_w) and (oldy-BUFFER < screen_h):
         frame.SetPosition(old_position)
-        print('restored')
+        log.debug("window position restored")
     # else wx python will choose
 
 class TimeKeeperGUI(TimeKeeperFrame):
@@ -64,54 +78,115 @@ class TimeKeeperGUI(TimeKeeperFrame):
         self.buttons += [self.make_btn(name) for name in settings["tasks"]]
         for name in settings["tasks"]:
             self.make_menuitem(name, self.show_specific_time)
-        self.timeclock = Timeclock()
         self.Bind(wx.EVT_TOGGLEBUTTON, self.btn_toggle)
         if STAY_ON_TOP:
             self.ToggleWindowStyle(wx.STAY_ON_TOP)
         set_position(self,settings['position'])
         self.main_panel.button_off.SetValue(True)
 
-        self.timer = wx.Timer()
-        self.timer.Bind(wx.EVT_TIMER, self.update_statusbar)
-        self.timer.Start(1000*10) # update every 10 seconds
+        # the window shows right away; the buttons come alive when the data is loaded
+        self.timeclock = None
+        for btn in self.buttons:
+            btn.Disable()
+        self.statusbar.SetStatusText("Loading times ...")
+        Thread(target=self.load_timeclock, daemon=True).start()
 
-    def update_statusbar(self, event=None):
-        self.statusbar.SetStatusText(self.timeclock.report())
+    def load_timeclock(self):
+        """runs in the background"""
+        try:
+            if daemon_running():
+                log.info("attaching to the timekeeper daemon")
+                timeclock = RemoteTimeclock(callback=self.update_statusbar)
+            else:
+                from timeclock import Timeclock
+                from storage import backup
+                backup()
+                startup_phase("backup")
+                timeclock = Timeclock(callback=self.update_statusbar)
+        except Exception as e:
+            log.exception("could not load the times")
+            wx.CallAfter(self.load_failed, f"{type(e).__name__}: {e}")
+            return
+        startup_phase("load times")
+        wx.CallAfter(self.timeclock_ready, timeclock)
+
+    def load_failed(self, error):
+        """the buttons stay off; nothing may be written over data that could not be read"""
+        self.statusbar.SetStatusText(f"Could not load the times: {error}")
+        wx.MessageBox(f"Could not load the times:\n\n{error}\n\nNothing will be recorded until this is fixed "
+            "and the timekeeper is restarted.", "Timekeeper", wx.OK | wx.ICON_ERROR, self)
+
+    def timeclock_ready(self, timeclock):
+        self.timeclock = timeclock
+        clocked_in = self.guarded(lambda: timeclock.clocked_in) # a daemon may be clocked in already
+        for btn in self.buttons:
+            btn.Enable()
+            btn.SetValue(btn.GetLabel() == (clocked_in or OFF))
+        self.timeclock.tick()
+        startup_phase("ready")
+        logs.flush() # the startup lines would wait for LOG_BUFFER more otherwise
+
+    def update_statusbar(self, text):
+        """called by the timeclock, from any thread, when the status changes"""
+        wx.CallAfter(self.set_status, text)
+
+    def set_status(self, text):
+        with metrics.measure("ui_refresh"):
+            self.statusbar.SetStatusText(text)
+
+    def guarded(self, func, *args):
+        """func(*args) from a wx handler; a daemon that went away is shown in the status bar instead of raised"""
+        try:
+            return func(*args)
+        except (OSError, DaemonError) as e:
+            log.error("timekeeper daemon: %s", e)
+            self.set_status(f"Lost the timekeeper daemon: {e}")
 
     def btn_toggle(self, event=None):
         clicked = event.EventObject
         for btn in self.buttons:
             if clicked is btn:
                 btn.SetValue(True)
-                self.timeclock.clock_in(btn.GetLabel())
+                self.guarded(self.timeclock.clock_in, btn.GetLabel())
             else:
                 btn.SetValue(False)
-        self.timeclock.save()
-        self.update_statusbar()
+        self.guarded(self.timeclock.save)
+
+    def bill(self, task):
+        self.guarded(self.timeclock.clock_billpoint, task)
 
     def on_close(self, event:wx.Event=None):
-        print(f"CLOSING. Size:{self.GetSize()}, Position: {self.GetPosition()}")
-        self.timeclock.save()
+        log.info("closing; size %s, position %s", tuple(self.GetSize()), tuple(self.GetPosition()))
+        if self.timeclock:
+            self.guarded(self.timeclock.flush)
         settings['position'] = tuple(self.GetPosition())
         save_settings(settings)
         SENTINEL_FILE.write_text("")
         event.Skip()
 
     def show_specific_time(self, task, event=None):
+        if not self.timeclock:
+            return # still loading
+        from reportview import ReportDialog
+        # modeless, and the report is made on a worker thread, so the buttons keep working meanwhile
+        ReportDialog(self, self.timeclock, task, billed_callback=(self.bill, task),
+            metric="taskreport_open").Show()
+
+    def show_diagnostics(self, event=None):
+        from timekeeper_wxg import ShowTimes
         try:
-            dlg = ShowTimes(self, billed_callback=(self.timeclock.clock_billpoint, task))
-            dlg.data.SetValue(self.timeclock.taskreport(task))
+            dlg = ShowTimes(self)
+            dlg.SetTitle("Diagnostics")
+            dlg.data.SetValue(metrics.summary() + "\n\nRecent log:\n" + "\n".join(logs.recent))
             dlg.ShowModal()
         finally:
             dlg.Destroy()
 
     def show_times(self, event=None):
-        try:
-            dlg = ShowTimes(self)
-            dlg.data.SetValue(self.timeclock.monthreport())
-            dlg.ShowModal()
-        finally:
-            dlg.Destroy()
+        if not self.timeclock:
+            return # still loading
+        from reportview import ReportDialog
+        ReportDialog(self, self.timeclock, metric="monthreport_open").Show()
 
 class AlreadyRunningFrame(AlreadyRunningFrameCore):
     def __init__(self, *args, **kwds):
@@ -134,6 +209,7 @@ class MyApp(wx.App):
         self.frm = TimeKeeperGUI(None, wx.ID_ANY, "")
         self.SetTopWindow(self.frm)
         self.frm.Show()
+        startup_phase("window")
         return True
 
 class AlreadyRunnigApp(wx.App):
@@ -152,6 +228,7 @@ def error_run():
 
 def main():
     global settings
+    startup_phase("imports")
     settings = load_settings()
     if SENTINEL_FILE.exists() and SENTINEL_FILE.read_text().strip():
         error_run()
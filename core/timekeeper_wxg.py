@@ -29,6 +29,8 @@ class TimeKeeperFrame(wx.Frame):
         wxglade_tmp_menu = wx.Menu()
         item = wxglade_tmp_menu.Append(wx.ID_ANY, "See times", "")
         self.Bind(wx.EVT_MENU, self.show_times, item)
+        item = wxglade_tmp_menu.Append(wx.ID_ANY, "Diagnostics", "")
+        self.Bind(wx.EVT_MENU, self.show_diagnostics, item)
         wxglade_tmp_menu.Append(wx.ID_EXIT, "Exit", "")
         self.Bind(wx.EVT_MENU, lambda evt: self.Close(), id=wx.ID_EXIT)
         self.frame_menubar.Append(wxglade_tmp_menu, "File")
@@ -61,6 +63,10 @@ class TimeKeeperFrame(wx.Frame):
         print("Event handler 'show_times' not implemented!")
         event.Skip()
 
+    def show_diagnostics(self, event):
+        print("Event handler 'show_diagnostics' not implemented!")
+        event.Skip()
+
     def on_close(self, event):
         print("Event handler 'on_close' not implemented!")
         event.Skip()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+"""
+Bulk export and import of the time history, for payroll and invoicing and
+for loading old data in. Rows are streamed in both directions, so neither
+side is ever built in memory as a whole.
+
+Formats:
+    csv     date,task,minutes,billed - one row per day and task; a billpoint
+            is a row with billed=1 and no minutes
+    jsonl   {"date": ..., "task": ..., "minutes": ...} or {"date": ..., "task": ..., "billed": true}
+    day     one line per day: the date, a tab and that day's timedata as json,
+            exactly as it is in timedata.json
+
+Importing merges like the nodes storage does: minutes are added to what is
+there and billpoints are set. With --max a day and task only goes up to the
+imported minutes, so importing the same file twice changes nothing.
+
+    python transfer.py export --format csv --since 2024-01-01 --task "TASK 1" -o payroll.csv
+    python transfer.py import legacy.jsonl
+"""
+
+import sys
+import csv
+import json
+from itertools import islice
+from contextlib import redirect_stdout
+
+from constants import DAY_FMT, SENTINEL_FILE
+from columnar import split_key
+from model import bad_minutes
+
+FORMATS = ("csv", "jsonl", "day")
+CHUNK = 1000 # days copied, or rows applied, per hold of the timeclock lock
+FLUSH_EVERY = 20 # chunks imported between saves
+CSV_FIELDS = ["date", "task", "minutes", "billed"]
+
+def in_range(day, since=None, until=None):
+    return (not since or day >= since) and (not until or day <= until)
+
+def export_days(timeclock, since=None, until=None, task=None):
+    """(day, times) in date order, copied from the timeclock CHUNK days at a time"""
+    timeclock.load_history()
+    with timeclock.lock:
+        days = sorted(day for day in timeclock.timedata if in_range(day, since, until))
+    for start in range(0, len(days), CHUNK):
+        with timeclock.lock:
+            chunk = [(day, dict(timeclock.timedata.get(day, {}))) for day in days[start:start+CHUNK]]
+        for day, times in chunk:
+            if task:
+                times = {key: value for key, value in times.items() if split_key(key, value)[0] == task}
+                if not times:
+                    continue
+            yield day, times
+
+def export_rows(timeclock, since=None, until=None, task=None):
+    """(day, task, minutes, billed) for every entry; billpoints have minutes None"""
+    for day, times in export_days(timeclock, since, until, task):
+        for key, value in times.items():
+            project, is_reset = split_key(key, value)
+            if is_reset:
+                yield day, project, None, True
+            else:
+                yield day, project, value, False
+
+def write_export(timeclock, out, fmt="csv", **filters):
+    """write the export to the text file out; returns the number of lines written"""
+    count = 0
+    if fmt == "day":
+        for day, times in export_days(timeclock, **filters):
+            out.write(f"{day}\t{json.dumps(times)}\n")
+            count += 1
+    elif fmt == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(CSV_FIELDS)
+        for day, task, minutes, billed in export_rows(timeclock, **filters):
+            writer.writerow([day, task, "" if billed else minutes, 1 if billed else ""])
+            count += 1
+    elif fmt == "jsonl":
+        for day, task, minutes, billed in export_rows(timeclock, **filters):
+            row = dict(date=day, task=task, billed=True) if billed else dict(date=day, task=task, minutes=minutes)
+            out.write(json.dumps(row) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"unknown format {fmt!r}; use one of {FORMATS}")
+    return count
+
+def read_rows(lines, fmt):
+    """(day, task, minutes, billed) from the lines of an export"""
+    if fmt == "csv":
+        for row in csv.DictReader(lines):
+            billed = row.get("billed", "").strip() not in ("", "0")
+            yield row["date"], row["task"], None if billed else int(row["minutes"] or 0), billed
+    elif fmt == "jsonl":
+        for line in lines:
+            if line.strip():
+                row = json.loads(line)
+                yield row["date"], row["task"], row.get("minutes"), bool(row.get("billed"))
+    elif fmt == "day":
+        for line in lines:
+            if line.strip():
+                day, times = line.split("\t", 1)
+                for key, value in json.loads(times).items():
+                    project, is_reset = split_key(key, value)
+                    yield day, project, None if is_reset else value, is_reset
+    else:
+        raise ValueError(f"unknown format {fmt!r}; use one of {FORMATS}")
+
+def import_rows(timeclock, rows, keep_max=False, since=None, until=None, task=None):
+    """
+    merge rows into the timeclock CHUNK at a time, each chunk as one store
+    write, saving every FLUSH_EVERY chunks; returns the number of rows used.
+    Negative minutes are corrections and are applied like any others.
+    """
+    timeclock.load_history() # keep_max compares against the whole history, not just the months paged in
+    count = 0
+    chunks = 0
+    rows = iter(rows)
+    while chunk := list(islice(rows, CHUNK)):
+        chunks += 1
+        imported = {} # (day, project): minutes
+        bills = []
+        for day, project, minutes, billed in chunk:
+            if not in_range(day, since, until) or (task and project != task):
+                continue
+            if billed:
+                bills.append(("bill", day, project, 1))
+                count += 1
+            elif minutes is not None:
+                if type(minutes) is not int:
+                    raise bad_minutes(day, project, minutes)
+                count += 1
+                key = day, project
+                if keep_max:
+                    imported[key] = max(imported.get(key, 0), minutes)
+                else:
+                    imported[key] = imported.get(key, 0) + minutes
+        with timeclock.lock:
+            changes = []
+            for (day, project), minutes in imported.items():
+                if keep_max:
+                    minutes = max(minutes - timeclock.timedata.minutes(day, project), 0)
+                if minutes:
+                    changes.append(("add", day, project, minutes))
+            timeclock.apply_changes(changes + bills)
+        if chunks % FLUSH_EVERY == 0:
+            timeclock.flush() # so the unsaved changes don't pile up in memory
+    return count
+
+def guess_format(path):
+    suffix = str(path).rsplit(".", 1)[-1].lower()
+    return {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(suffix, "day")
+
+def main():
+    import argparse
+    from datetime import datetime
+
+    def date(text):
+        return datetime.strptime(text, DAY_FMT).strftime(DAY_FMT)
+
+    parser = argparse.ArgumentParser(description="export or import the time history")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("file", nargs="?", help="file to import")
+    parser.add_argument("-o", "--output", help="file to export to (default: stdout)")
+    parser.add_argument("-f", "--format", choices=FORMATS, help="default: csv for export, from the file name for import")
+    parser.add_argument("--since", type=date, help=f"first day ({DAY_FMT})")
+    parser.add_argument("--until", type=date, help=f"last day ({DAY_FMT})")
+    parser.add_argument("--task", help="only this task")
+    parser.add_argument("--max", action="store_true", help="import: don't add, only raise each day's minutes to the imported ones")
+    args = parser.parse_args()
+    filters = dict(since=args.since, until=args.until, task=args.task)
+
+    from timeclock import Timeclock
+    if args.action == "export":
+        out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+        # the timeclock's own messages must not end up in the export
+        with redirect_stdout(sys.stderr):
+            try:
+                count = write_export(Timeclock(), out, args.format or "csv", **filters)
+            finally:
+                if args.output:
+                    out.close()
+        print(f"exported {count} lines", file=sys.stderr)
+        return
+
+    if not args.file:
+        parser.error("import needs a file")
+    from client import daemon_running
+    if daemon_running():
+        sys.exit("the timekeeper daemon is running; stop it before importing")
+    if SENTINEL_FILE.exists() and SENTINEL_FILE.read_text().strip():
+        sys.exit(f"the timekeeper is open ({SENTINEL_FILE.read_text().strip()}); close it before importing")
+    timeclock = Timeclock()
+    with open(args.file, newline="", encoding="utf-8") as f:
+        count = import_rows(timeclock, read_rows(f, args.format or guess_format(args.file)), args.max, **filters)
+    timeclock.flush()
+    print(f"imported {count} rows", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
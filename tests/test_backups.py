@@ -0,0 +1,56 @@
+import os
+import sys
+import lzma
+import time
+import hashlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "core"))
+
+from backups import Backup, STAMP_FMT, keep_set, prune, list_backups, object_file, refs_folder, ref_name
+
+NOW = time.mktime(time.strptime("2024-06-15-12-00-00", STAMP_FMT))
+
+def stamp_backup(stamp, digest="0"*64):
+    return Backup(stamp, digest, "here")
+
+def add(folder, stamp, content, age):
+    """a backup made at stamp whose object was last written age seconds before NOW"""
+    digest = hashlib.sha256(content).hexdigest()
+    obj = object_file(digest, folder)
+    obj.parent.mkdir(parents=True, exist_ok=True)
+    obj.write_bytes(lzma.compress(content))
+    os.utime(obj, (NOW - age, NOW - age))
+    refs_folder(folder).mkdir(parents=True, exist_ok=True)
+    bkup = Backup(stamp, digest, "here")
+    (refs_folder(folder) / ref_name(bkup)).touch()
+    return bkup
+
+def test_keep_set_buckets():
+    stamps = ["2024-03-01-09-00-00", "2024-03-20-09-00-00", # monthly
+        "2024-06-10-08-00-00", "2024-06-10-20-00-00", # daily
+        "2024-06-15-11-10-00", "2024-06-15-11-40-00"] # hourly
+    keep = keep_set([stamp_backup(stamp) for stamp in stamps], NOW)
+    assert sorted(bkup.stamp for bkup in keep) == [stamps[1], stamps[3], stamps[5]]
+
+def test_prune(tmp_path):
+    day = 86400
+    one = add(tmp_path, "2024-03-01-00-00-00", b"one", 90*day)
+    add(tmp_path, "2024-03-05-00-00-00", b"two", 80*day)
+    two = add(tmp_path, "2024-03-20-00-00-00", b"two", 80*day)
+    three = add(tmp_path, "2024-06-15-11-10-00", b"three", 3000)
+    four = add(tmp_path, "2024-06-15-11-40-00", b"four", 1200)
+    stray = object_file(hashlib.sha256(b"stray").hexdigest(), tmp_path) # its ref hasn't synced yet
+    stray.write_bytes(lzma.compress(b"stray"))
+    os.utime(stray, (NOW - 90*day, NOW - 90*day))
+
+    assert prune(tmp_path, NOW) == 2
+    assert not object_file(one.digest, tmp_path).exists()
+    assert object_file(two.digest, tmp_path).exists() # still used by the 03-20 ref
+    assert stray.exists()
+    assert list_backups(tmp_path) == [two, three, four] # three's object is too new to go
+
+    assert prune(tmp_path, NOW + 2*day) == 1
+    assert list_backups(tmp_path) == [two, four]
+    assert not object_file(three.digest, tmp_path).exists()
+    assert stray.exists()
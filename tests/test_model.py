@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "core"))
+
+from model import TimeData
+
+def test_negative_minutes():
+    data = TimeData({"2024-01-05": {"A": -15}})
+    data.add("2024-01-05", "A", -5)
+    data["2024-01-05"]["B"] = -1
+    assert data.to_dict() == {"2024-01-05": {"A": -20, "B": -1}}
+
+def test_fractional_minutes_name_the_day_and_task():
+    with pytest.raises(ValueError, match="2024-01-05 A"):
+        TimeData({"2024-01-05": {"B": 1, "A": 1.5}})
+    data = TimeData({"2024-01-05": {"B": 1}})
+    with pytest.raises(ValueError, match="2024-01-05 A"):
+        data.add("2024-01-05", "A", 1.5)
+    with pytest.raises(ValueError, match="2024-01-05 B"):
+        data["2024-01-05"]["B"] = 0.5
+    assert data.to_dict() == {"2024-01-05": {"B": 1}} # left as it was
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "core"))
+
+from moduleinstaller import version_matches
+
+def test_pre_and_post_releases_are_ordered():
+    assert not version_matches("2.0a1", ">=", "2.0rc1")
+    assert version_matches("2.0.dev1", "<", "2.0a1")
+    assert version_matches("2.0b2", ">", "2.0b1")
+    assert version_matches("2.0rc1", "<", "2.0")
+    assert version_matches("2.0", "<", "2.0.post1")
+
+def test_equal_is_exact():
+    assert not version_matches("2.0rc1", "==", "2.0b1")
+    assert not version_matches("4.2.1.post1", "==", "4.2.1")
+    assert version_matches("2.0", "==", "2")
+
+def test_prefixes_keep_trailing_zeros():
+    assert not version_matches("2.5", "==", "2.0.*")
+    assert version_matches("2.5", "!=", "2.0.*")
+    assert version_matches("2.0.3", "==", "2.0.*")
+    assert version_matches("2", "==", "2.0.*")
+    assert not version_matches("1.5", "~=", "1.0.0")
+    assert version_matches("1.0.7", "~=", "1.0.0")
+    assert version_matches("1.5", "~=", "1.0")
+    assert not version_matches("2.0", "~=", "1.0")
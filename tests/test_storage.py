@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "core"))
+
+import storage
+from storage import JournalStore, SqliteStore, copy_timedata
+
+storage.BACKUPS = False # never back up the real timedata.json from a test
+
+def journal_store(folder):
+    return JournalStore(folder / "timedata.json", folder / "timedata.journal")
+
+def test_torn_journal_line_is_cut_off(tmp_path):
+    store = journal_store(tmp_path)
+    store.load()
+    store.record("add", "2024-01-05", "A", 1)
+    store.f.close()
+    with open(store.journal, "a", newline="") as f:
+        f.write("2024-01-09\tadd\t7") # a crash in the middle of a record()
+
+    store = journal_store(tmp_path)
+    data = store.load()
+    assert data.minutes("2024-01-05", "A") == 1
+    assert "2024-01-09" not in data
+    store.record("add", "2024-01-05", "A", 1)
+    store.f.close()
+
+    data = journal_store(tmp_path).load()
+    assert data.minutes("2024-01-05", "A") == 2
+    assert "2024-01-09" not in data
+
+def test_clocking_in_changes_no_day(tmp_path):
+    store = journal_store(tmp_path)
+    store.load()
+    store.record("add", "2024-01-05", "A", 1)
+    store.f.write("2024-01-06\tin\t1\tA\n") # written by older versions on every clock in
+    store.f.close()
+    data = journal_store(tmp_path).load()
+    assert "2024-01-06" not in data
+
+def test_import_all_into_journal(tmp_path):
+    """what storage.py migrate --to journal does"""
+    data = {"2024-01-05": {"A": 30, "A_RESET": True}, "2024-01-06": {"B": 15}}
+    journal_store(tmp_path).import_all(data)
+    assert copy_timedata(journal_store(tmp_path).load()) == data
+
+def test_sqlite_keeps_empty_days(tmp_path):
+    data = {"2024-01-05": {"A": 30}, "2024-02-01": {}}
+    store = SqliteStore(tmp_path / "timedata.sqlite", legacy=tmp_path / "none.json")
+    store.import_all(data)
+    assert copy_timedata(store.load()) == data
+    assert len(store.month_days(None)) == 2
+
+def test_binary_store_queries_match_the_timedata(tmp_path):
+    from datetime import date
+    from storage import BinaryStore
+    data = {"2024-01-05": {"A": 30, "B": 5}, "2024-01-06": {"A_RESET": True},
+        "2024-02-01": {}, "2024-02-03": {"A": 10}}
+    store = BinaryStore(tmp_path / "timedata.tkc", legacy=tmp_path / "none.json")
+    store.import_all(data)
+    timedata = store.load()
+    assert store.columnar_file() is not None
+    for since in (None, date(2024, 1, 5)):
+        assert store.task_days(timedata, "A", since) == timedata.task_days("A", since)
+    assert store.month_days(timedata) == timedata.month_days()
+
+    timedata.add("2024-02-03", "A", 1)
+    store.record("add", "2024-02-03", "A", 1)
+    assert store.columnar_file() is None # falls back to the timedata until saved
+    assert store.task_days(timedata, "A")[0][date(2024, 2, 3)] == 11
+    store.save(timedata)
+    assert store.task_days(timedata, "A")[0][date(2024, 2, 3)] == 11
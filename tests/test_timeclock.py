@@ -0,0 +1,30 @@
+import sys
+import json
+from pathlib import Path
+from threading import Thread
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "core"))
+
+import storage
+from storage import ShardedStore
+from timeclock import Timeclock
+
+storage.BACKUPS = False
+
+def sharded_timeclock(folder):
+    return Timeclock(store=ShardedStore(folder / "data", legacy=folder / "timedata.json"))
+
+def test_history_is_read_without_the_lock(tmp_path):
+    (tmp_path / "timedata.json").write_text(json.dumps({"2020-01-05": {"A": 30}, "2020-02-05": {"A": 5}}))
+    sharded_timeclock(tmp_path).flush()
+    timeclock = sharded_timeclock(tmp_path)
+    read_shard = timeclock.store.read_shard
+    free = []
+    def read_while_ticking(month):
+        thread = Thread(target=lambda: free.append(timeclock.lock.acquire(timeout=1) and timeclock.lock.release() is None))
+        thread.start()
+        thread.join()
+        return read_shard(month)
+    timeclock.store.read_shard = read_while_ticking
+    assert timeclock.month_aggregates().totals["2020-01"]["A"] == 30
+    assert free == [True, True]
@@ -0,0 +1,37 @@
+import sys
+import json
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "core"))
+
+import storage
+from storage import JsonStore, ShardedStore
+from timeclock import Timeclock
+from transfer import import_rows, read_rows
+
+storage.BACKUPS = False
+
+def sharded_timeclock(folder):
+    return Timeclock(store=ShardedStore(folder / "data", legacy=folder / "timedata.json"))
+
+def test_reimport_with_max_on_sharded_storage(tmp_path):
+    (tmp_path / "timedata.json").write_text(json.dumps({"2020-01-05": {"A": 30}}))
+    sharded_timeclock(tmp_path).flush() # splits the file into month shards
+    rows = [("2020-01-05", "A", 30, False), ("2020-01-06", "B", 10, False)]
+    for _ in range(2):
+        timeclock = sharded_timeclock(tmp_path) # 2020-01 is not paged in
+        assert import_rows(timeclock, rows, keep_max=True) == 2
+        timeclock.flush()
+    timeclock = sharded_timeclock(tmp_path)
+    timeclock.load_history()
+    assert timeclock.timedata.minutes("2020-01-05", "A") == 30
+    assert timeclock.timedata.minutes("2020-01-06", "B") == 10
+
+def test_import_negative_minutes(tmp_path):
+    timeclock = Timeclock(store=JsonStore(tmp_path / "timedata.json"))
+    lines = ['{"date": "2024-01-05", "task": "A", "minutes": -15}',
+        '{"date": "2024-01-05", "task": "A", "minutes": 20}',
+        '{"date": "2024-01-05", "task": "B"}'] # no minutes: not imported, not counted
+    assert import_rows(timeclock, read_rows(lines, "jsonl")) == 2
+    assert timeclock.timedata.minutes("2024-01-05", "A") == 5
+    assert "B" not in timeclock.timedata["2024-01-05"]
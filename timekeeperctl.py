@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+
+import sys
+from pathlib import Path
+
+# dirty hack to avoid dealing with package imports
+sys.path.append(str(Path(__file__).parent/'core'))
+
+from core.client import main
+main()